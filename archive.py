@@ -0,0 +1,231 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from config import DATABASE_PATH, DEFAULT_CLUB_ID
+from database import Database, check_progress
+
+# Bulk import/export of club history for admins:
+#
+#   python archive.py import history.jsonl
+#   python archive.py import users.csv books.csv reading_sessions.csv
+#   python archive.py export history.jsonl
+#   python archive.py export backup/ --format csv
+#
+# JSONL records carry a "type" of user, book or session; CSV files are named
+# after their table. Users without a club_id join the default club; books and
+# sessions follow their member's club and are rejected if that member is in
+# neither the database nor the import. A session identical to one already
+# stored (same member, book, pages and time) is skipped, so importing the same
+# file twice does not count its reading twice. Run imports while the bot is
+# stopped: its in-memory user and book caches do not see rows written from here.
+
+BATCH_SIZE = 10000
+
+TABLES = {
+    'user': ('users', ['user_id', 'name', 'username', 'is_active', 'is_admin', 'club_id']),
+    'book': ('books', ['user_id', 'book_name', 'start_page', 'last_page', 'finished']),
+    'session': ('reading_sessions', ['user_id', 'book_name', 'from_page', 'to_page', 'pages', 'created_at']),
+}
+CSV_TYPES = {table: kind for kind, (table, columns) in TABLES.items()}
+
+INSERTS = {
+    'user': 'INSERT OR REPLACE INTO users (user_id, name, username, is_active, is_admin, club_id) VALUES (?, ?, ?, ?, ?, ?)',
+    'book': 'INSERT OR REPLACE INTO books (user_id, book_name, start_page, last_page, finished) VALUES (?, ?, ?, ?, ?)',
+    'session': '''INSERT INTO reading_sessions (user_id, book_name, from_page, to_page, pages, created_at)
+                  SELECT ?1, ?2, ?3, ?4, ?5, ?6
+                  WHERE NOT EXISTS (SELECT 1 FROM reading_sessions
+                                    WHERE user_id = ?1 AND created_at = ?6 AND book_name = ?2
+                                      AND from_page = ?3 AND to_page = ?4)''',
+}
+
+# Every club seen among the members gets a clubs row, and imported books take
+# their member's club.
+ASSIGN_CLUBS = [
+    'INSERT OR IGNORE INTO clubs (club_id) SELECT DISTINCT club_id FROM users WHERE club_id IS NOT NULL',
+    'UPDATE books SET club_id = (SELECT club_id FROM users u WHERE u.user_id = books.user_id) WHERE club_id IS NULL',
+]
+
+# Imported sessions take their member's club and are then folded into the
+# rollups with one set-based UPSERT per table instead of one statement per session.
+ROLLUPS = [
+    '''UPDATE reading_sessions SET club_id = (SELECT club_id FROM users u WHERE u.user_id = reading_sessions.user_id)
+       WHERE id > ?''',
+    '''INSERT INTO daily_reading (user_id, date, pages_read, club_id)
+       SELECT user_id, substr(created_at, 1, 10), SUM(pages), club_id FROM reading_sessions WHERE id > ? GROUP BY 1, 2, 4
+       ON CONFLICT (user_id, club_id, date) DO UPDATE SET pages_read = pages_read + excluded.pages_read''',
+    '''INSERT INTO weekly_reading (user_id, week, pages_read, club_id)
+       SELECT user_id, strftime('%Y-%W', created_at), SUM(pages), club_id FROM reading_sessions WHERE id > ? GROUP BY 1, 2, 4
+       ON CONFLICT (user_id, club_id, week) DO UPDATE SET pages_read = pages_read + excluded.pages_read''',
+    '''INSERT INTO reading_totals (user_id, club_id, pages_read, sessions, last_read_at)
+       SELECT user_id, club_id, SUM(pages), COUNT(*), MAX(created_at) FROM reading_sessions WHERE id > ? GROUP BY 1, 2
+       ON CONFLICT (user_id, club_id) DO UPDATE SET pages_read = pages_read + excluded.pages_read,
+                                                    sessions = sessions + excluded.sessions,
+                                                    last_read_at = MAX(COALESCE(last_read_at, ''), excluded.last_read_at)''',
+]
+
+
+def _flag(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, str):
+        return int(value.strip().lower() in ('1', 'true', 'yes'))
+    return int(bool(value))
+
+
+def _check_pages(from_page, to_page):
+    # A range starting at page 1 is a new book; anything else continues one.
+    return check_progress(to_page, from_page if from_page > 1 else None)
+
+
+def parse_record(kind, record, users=None):
+    # users: ids a book or session may belong to; None skips that check.
+    user_id = int(record['user_id'])
+    if kind in ('book', 'session') and users is not None and user_id not in users:
+        raise ValueError(f"unknown user {user_id}")
+    if kind == 'user':
+        return (user_id, record['name'], record.get('username') or "N/A",
+                _flag(record.get('is_active'), 1), _flag(record.get('is_admin'), 0),
+                int(record.get('club_id') or DEFAULT_CLUB_ID))
+    if kind == 'book':
+        start_page, last_page = int(record['start_page']), int(record['last_page'])
+        error = _check_pages(start_page, last_page)
+        if error:
+            raise ValueError(error)
+        return (user_id, record['book_name'], start_page, last_page, _flag(record.get('finished'), 0))
+    if kind == 'session':
+        from_page, to_page = int(record['from_page']), int(record['to_page'])
+        error = _check_pages(from_page, to_page)
+        if error:
+            raise ValueError(error)
+        created_at = datetime.fromisoformat(record['created_at']).isoformat(timespec='seconds')
+        return (user_id, record['book_name'], from_page, to_page, to_page - from_page, created_at)
+    raise ValueError(f"unknown record type {kind!r}")
+
+
+def read_records(path):
+    path = Path(path)
+    with path.open(newline='', encoding='utf-8') as f:
+        if path.suffix == '.csv':
+            kind = CSV_TYPES.get(path.stem)
+            for line, record in enumerate(csv.DictReader(f), start=2):
+                yield path.name, line, kind, record
+        else:
+            for line, text in enumerate(f, start=1):
+                if text.strip():
+                    record = json.loads(text)
+                    yield path.name, line, record.pop('type', None), record
+
+
+def _imported_users(paths):
+    # First pass over the input, so books and sessions may come before their users.
+    users = set()
+    for path in paths:
+        for name, line, kind, record in read_records(path):
+            if kind == 'user':
+                try:
+                    users.add(parse_record(kind, record)[0])
+                except (KeyError, ValueError, TypeError):
+                    pass
+    return users
+
+
+def _insert(conn, kind, batch, counts):
+    # Counts rows actually written; duplicate sessions are skipped by the INSERT.
+    before = conn.total_changes
+    conn.executemany(INSERTS[kind], batch)
+    counts[kind] += conn.total_changes - before
+    batch.clear()
+
+
+def import_history(db, paths, max_errors=20):
+    conn = db.conn
+    counts = dict.fromkeys(TABLES, 0)
+    errors = 0
+    pending = {kind: [] for kind in TABLES}
+    started = time.perf_counter()
+    last_session = conn.execute('SELECT COALESCE(MAX(id), 0) FROM reading_sessions').fetchone()[0]
+    users = {user_id for (user_id,) in conn.execute('SELECT user_id FROM users')} | _imported_users(paths)
+    with conn:
+        for path in paths:
+            for name, line, kind, record in read_records(path):
+                try:
+                    row = parse_record(kind, record, users)
+                except (KeyError, ValueError, TypeError) as e:
+                    errors += 1
+                    if errors <= max_errors:
+                        print(f"{name}:{line}: skipped: {e}", file=sys.stderr)
+                    continue
+                batch = pending[kind]
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    _insert(conn, kind, batch, counts)
+        for kind, batch in pending.items():
+            if batch:
+                _insert(conn, kind, batch, counts)
+        for statement in ASSIGN_CLUBS:
+            conn.execute(statement)
+        if counts['session']:
+            for statement in ROLLUPS:
+                conn.execute(statement, (last_session,))
+    elapsed = time.perf_counter() - started
+    print(f"imported {counts['user']} users, {counts['book']} books, {counts['session']} sessions "
+          f"in {elapsed:.2f}s ({errors} rows skipped)")
+    return counts
+
+
+def _export_queries():
+    for kind, (table, columns) in TABLES.items():
+        order = 'id' if kind == 'session' else 'user_id'
+        yield kind, table, columns, f"SELECT {', '.join(columns)} FROM {table} ORDER BY {order}"
+
+
+def export_jsonl(db, out):
+    for kind, table, columns, query in _export_queries():
+        for row in db.conn.execute(query):
+            record = {'type': kind}
+            record.update(zip(columns, row))
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def export_csv(db, directory):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for kind, table, columns, query in _export_queries():
+        with (directory / f"{table}.csv").open('w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(db.conn.execute(query))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export book club history")
+    parser.add_argument('--database', default=DATABASE_PATH)
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="load users, books and sessions from JSONL or CSV")
+    import_parser.add_argument('paths', nargs='+')
+    export_parser = commands.add_parser('export', help="write users, books and sessions out")
+    export_parser.add_argument('path', help="output file ('-' for stdout), or a directory with --format csv")
+    export_parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    args = parser.parse_args()
+
+    db = Database(args.database)
+    try:
+        if args.command == 'import':
+            import_history(db, args.paths)
+        elif args.format == 'csv':
+            export_csv(db, args.path)
+        elif args.path == '-':
+            export_jsonl(db, sys.stdout)
+        else:
+            with open(args.path, 'w', encoding='utf-8') as out:
+                export_jsonl(db, out)
+    finally:
+        db.conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from aiogram import types
+from aiogram.client.session.base import BaseSession
+from config import YOUR_ADMIN_ID, DEFAULT_CLUB_ID
+from migrations import migrate
+
+# Offline load test: drives main.dp with synthetic updates against a seeded
+# throwaway database. Telegram is replaced by FakeSession, so nothing leaves
+# the process.
+#
+#   python benchmark.py --users 10000 --flows 500 --concurrency 50
+
+
+class FakeSession(BaseSession):
+    def __init__(self):
+        super().__init__()
+        self.requests = defaultdict(int)
+        self.message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        self.requests[type(method).__name__] += 1
+        if isinstance(method.__returning__, type) and issubclass(method.__returning__, types.Message):
+            chat_id = getattr(method, 'chat_id', None) or 0
+            return types.Message(message_id=next(self.message_ids), date=datetime.now(),
+                                 chat=types.Chat(id=int(chat_id), type='private'),
+                                 text=getattr(method, 'text', None))
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+
+def seed(path, users, books_per_user):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    with conn:
+        conn.executemany('INSERT INTO users (user_id, name, username, is_active, is_admin, club_id) VALUES (?, ?, ?, 1, 0, ?)',
+                         ((user_id, f'Reader {user_id}', f'reader{user_id}', DEFAULT_CLUB_ID) for user_id in range(1, users + 1)))
+        conn.execute('INSERT OR REPLACE INTO users (user_id, name, username, is_active, is_admin, club_id) VALUES (?, ?, ?, 1, 1, ?)',
+                     (int(YOUR_ADMIN_ID), 'Admin', 'admin', DEFAULT_CLUB_ID))
+        conn.executemany('INSERT INTO books (user_id, book_name, start_page, last_page, finished, club_id) VALUES (?, ?, 1, ?, ?, ?)',
+                         ((user_id, f'Book {n}', 10 + n * 20, int(n % 3 == 2), DEFAULT_CLUB_ID)
+                          for user_id in range(1, users + 1) for n in range(books_per_user)))
+    conn.close()
+
+
+_update_ids = itertools.count(1)
+
+
+def _user(user_id):
+    return types.User(id=user_id, is_bot=False, first_name=f'Reader {user_id}')
+
+
+def _chat(user_id):
+    return types.Chat(id=user_id, type='private')
+
+
+def message_update(user_id, text):
+    return types.Update(update_id=next(_update_ids), message=types.Message(
+        message_id=next(_update_ids), date=datetime.now(), chat=_chat(user_id), from_user=_user(user_id), text=text))
+
+
+def callback_update(user_id, data):
+    return types.Update(update_id=next(_update_ids), callback_query=types.CallbackQuery(
+        id=str(next(_update_ids)), chat_instance='bench', from_user=_user(user_id), data=data,
+        message=types.Message(message_id=next(_update_ids), date=datetime.now(), chat=_chat(user_id), text='...')))
+
+
+# ops/s is completions per second of wall-clock time between a handler's first
+# start and its last finish, so it reflects concurrency rather than 1/latency.
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.spans = {}
+
+    async def measure(self, name, awaitable):
+        started = time.perf_counter()
+        await awaitable
+        finished = time.perf_counter()
+        self.samples[name].append(finished - started)
+        first, last = self.spans.get(name, (started, finished))
+        self.spans[name] = (min(first, started), max(last, finished))
+
+    def report(self):
+        lines = [f"{'handler':<22}{'count':>8}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}"]
+        for name, samples in self.samples.items():
+            samples = sorted(samples)
+            first, last = self.spans[name]
+            wall = last - first
+            p50 = samples[int(0.50 * (len(samples) - 1))]
+            p99 = samples[int(0.99 * (len(samples) - 1))]
+            lines.append(f"{name:<22}{len(samples):>8}{len(samples) / wall if wall else 0:>10.0f}"
+                         f"{p50 * 1000:>10.2f}{p99 * 1000:>10.2f}")
+        return "\n".join(lines)
+
+
+async def report_flow(main, recorder, user_id, n):
+    book_name = f"Bench {user_id}-{n}"
+    steps = [
+        ('today_read', message_update(user_id, "Today have read 📚")),
+        ('add_new_book', message_update(user_id, "+ add new one  📕")),
+        ('process_book_name', message_update(user_id, book_name)),
+        ('process_last_page', message_update(user_id, "42")),
+        ('process_book_status', callback_update(user_id, "book_not_finished")),
+        ('process_group_send', callback_update(user_id, "send_to_group")),
+    ]
+    for name, update in steps:
+        await recorder.measure(name, main.dp.feed_update(main.bot, update))
+
+
+async def run(args):
+    import main
+
+    main.db.path = args.database
+    main.bot.session = session = FakeSession()
+    # Let the outbox drain as fast as the fake session accepts messages.
+    main.outbox.chat_rate = main.outbox.global_bucket.rate = 1e9
+    # No local /metrics server; the benchmark prints its own numbers.
+    main.METRICS_PORT = None
+    # Synthetic users fire updates far faster than people do; don't throttle them.
+    main.throttling.rate = main.throttling.burst = 1e9
+    main.throttling.cooldowns = {}
+    await main.dp.emit_startup(bot=main.bot, dispatcher=main.dp)
+    recorder = Recorder()
+    try:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def flow(n):
+            async with semaphore:
+                await report_flow(main, recorder, n % args.users + 1, n)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(flow(n) for n in range(args.flows)))
+        elapsed = time.perf_counter() - started
+        print(f"report flow: {args.flows} flows in {elapsed:.2f}s ({args.flows * 6 / elapsed:.0f} updates/s)")
+
+        admin_id = int(YOUR_ADMIN_ID)
+        for _ in range(args.reports):
+            await recorder.measure('overall_result', main.dp.feed_update(main.bot, message_update(admin_id, "Overall result 📊")))
+            await recorder.measure('daily_report', main.daily_report(DEFAULT_CLUB_ID))
+            await recorder.measure('weekly_report', main.weekly_report(DEFAULT_CLUB_ID))
+    finally:
+        await main.dp.emit_shutdown(bot=main.bot, dispatcher=main.dp)
+
+    print(recorder.report())
+    print("telegram requests:", dict(session.requests))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test for the book club bot")
+    parser.add_argument('--users', type=int, default=1000, help="members to seed")
+    parser.add_argument('--books', type=int, default=3, help="books to seed per member")
+    parser.add_argument('--flows', type=int, default=200, help="full report flows to run")
+    parser.add_argument('--concurrency', type=int, default=20, help="report flows in flight at once")
+    parser.add_argument('--reports', type=int, default=5, help="runs of overall_result and the scheduled reports")
+    parser.add_argument('--database', help="seeded database to reuse instead of a fresh temporary one")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.database is None:
+            args.database = os.path.join(tmp, 'book_club.db')
+            seed(args.database, args.users, args.books)
+        asyncio.run(run(args))
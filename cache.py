@@ -0,0 +1,89 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=MISSING):
+        try:
+            value = self.data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def pop(self, key):
+        self.data.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+
+# Shares an async stream between callers for a short window. The first caller
+# for a key consumes the source itself, getting each item as soon as it is
+# produced, while the items are recorded; a stream that finishes with at most
+# `max_items` items is then replayed from memory for `ttl` seconds. Callers
+# arriving while it runs wait for it and replay it, or run the source
+# themselves if it was too big to keep. Close abandoned streams with aclosing()
+# so waiters are released right away.
+class SharedStream:
+    def __init__(self, ttl, max_items=20, maxsize=256):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.results = LRUCache(maxsize)
+        self.running = {}
+
+    async def stream(self, key, source):
+        running = self.running.get(key)
+        if running is not None:
+            # A waiter that gets cancelled must not cancel the shared run.
+            await asyncio.shield(running)
+        cached = self.results.get(key, None)
+        if cached is not None and cached[0] > time.monotonic():
+            for item in cached[1]:
+                yield item
+            return
+        if key in self.running:
+            async for item in source():
+                yield item
+            return
+        done = self.running[key] = asyncio.get_running_loop().create_future()
+        items, complete = [], False
+        try:
+            async for item in source():
+                if items is not None:
+                    items.append(item)
+                    if len(items) > self.max_items:
+                        items = None
+                yield item
+            complete = True
+        finally:
+            del self.running[key]
+            done.set_result(None)
+            if complete and items is not None:
+                self.results.set(key, (time.monotonic() + self.ttl, items))
+
+    def invalidate(self, key):
+        self.results.pop(key)
@@ -0,0 +1,127 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from aiogram.types import BufferedInputFile
+from cache import LRUCache
+from config import CHART_WORKERS, CHART_DAYS
+
+FINISHED_COLOR = '#55a868'
+READING_COLOR = '#8da0cb'
+PAGES_COLOR = '#4c72b0'
+
+
+def _pyplot():
+    # Imported in the worker process only; the bot process never loads matplotlib.
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib import pyplot
+    return pyplot
+
+
+def render_stats(title, since, days, books):
+    # Pure function run in the process pool: rows in, PNG bytes out.
+    # since: first day shown (YYYY-MM-DD); days: (YYYY-MM-DD, pages);
+    # books: (label, first read, last read, finished).
+    pyplot = _pyplot()
+    from matplotlib.dates import AutoDateLocator, ConciseDateFormatter, date2num
+
+    figure, (daily, timeline) = pyplot.subplots(2, 1, figsize=(8, 8), height_ratios=(1, 1.4))
+    try:
+        figure.suptitle(title)
+        daily.set_title(f"Pages per day, last {CHART_DAYS} days")
+        first_day = datetime.strptime(since, '%Y-%m-%d')
+        daily.bar([date2num(datetime.strptime(day, '%Y-%m-%d')) for day, pages in days],
+                  [pages for day, pages in days], color=PAGES_COLOR)
+        daily.set_xlim(date2num(first_day) - 1, date2num(first_day + timedelta(days=CHART_DAYS)))
+        daily.set_ylabel("pages")
+
+        timeline.set_title("Books (green: finished)")
+        for row, (label, first, last, finished) in enumerate(books):
+            start = date2num(datetime.fromisoformat(first))
+            width = max(date2num(datetime.fromisoformat(last)) - start, 0.5)
+            timeline.barh(row, width, left=start, color=FINISHED_COLOR if finished else READING_COLOR)
+        timeline.set_yticks(range(len(books)))
+        timeline.set_yticklabels([label[:40] for label, *rest in books])
+        timeline.invert_yaxis()
+        for axis in (daily, timeline):
+            locator = AutoDateLocator()
+            axis.xaxis.set_major_locator(locator)
+            axis.xaxis.set_major_formatter(ConciseDateFormatter(locator))
+
+        figure.tight_layout()
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png', dpi=100)
+        return buffer.getvalue()
+    finally:
+        pyplot.close(figure)
+
+
+# /stats charts. Rendering runs in a process pool so matplotlib never blocks
+# the event loop. Each chart is cached per user or club together with the id
+# of the newest reading session it shows (and the day, since the window
+# moves), so it is only rendered again after new reading is recorded. Once
+# Telegram has the PNG, the cache keeps its file_id instead of the bytes.
+class Charts:
+    def __init__(self, db, workers=CHART_WORKERS, cache_size=1024):
+        self.db = db
+        self.workers = workers
+        self.executor = None
+        self.cache = LRUCache(cache_size)
+        self.renders = 0
+
+    async def _render(self, *args):
+        if self.executor is None:
+            # spawn, not fork: forking a process that runs the event loop and the
+            # aiosqlite threads can deadlock the child on a lock held at fork time.
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.renders += 1
+        return await asyncio.get_running_loop().run_in_executor(self.executor, render_stats, *args)
+
+    async def _send(self, bot, chat_id, key, last_session, load):
+        # Returns False when there is no reading to chart yet.
+        if last_session is None:
+            return False
+        version = (last_session, datetime.now().strftime('%Y-%m-%d'))
+        cached = self.cache.get(key, None)
+        if cached is not None and cached[0] == version:
+            photo = cached[1]
+        else:
+            photo = await self._render(*await load())
+            self.cache.set(key, (version, photo))
+        if isinstance(photo, bytes):
+            photo = BufferedInputFile(photo, filename='stats.png')
+        message = await bot.send_photo(chat_id, photo)
+        if message.photo:
+            self.cache.set(key, (version, message.photo[-1].file_id))
+        return True
+
+    @staticmethod
+    def _since():
+        return (datetime.now() - timedelta(days=CHART_DAYS - 1)).strftime('%Y-%m-%d')
+
+    async def send_user_chart(self, bot, chat_id, user):
+        user_id, name = user[0], user[1]
+
+        async def load():
+            since = self._since()
+            return (f"{name}'s reading", since, await self.db.get_pages_per_day(user_id, since),
+                    await self.db.get_book_timeline(user_id))
+
+        return await self._send(bot, chat_id, ('user', user_id), await self.db.get_last_session_id(user_id), load)
+
+    async def send_club_chart(self, bot, chat_id, club):
+        club_id, title = club[0], club[1]
+
+        async def load():
+            since = self._since()
+            return (f"{title or 'Club'} reading", since, await self.db.get_club_pages_per_day(club_id, since),
+                    await self.db.get_club_book_timeline(club_id, since))
+
+        return await self._send(bot, chat_id, ('club', club_id), await self.db.get_club_last_session_id(club_id), load)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
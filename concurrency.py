@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.fsm.storage.base import BaseEventIsolation
+from cache import LRUCache
+from sender import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+SLOW_DOWN = "Slow down a little, please 🙂"
+COOLDOWN = "Please wait {seconds} s before doing that again ⏳"
+OVERLOADED = "The bot is very busy right now, please try again in a minute 🙏"
+
+
+class KeyedLock:
+    def __init__(self):
+        self.locks = {}
+
+    @asynccontextmanager
+    async def hold(self, key):
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+
+# Dispatcher events_isolation: the FSM middleware holds the lock for a user's
+# storage key while it loads their state and runs the handler, so one user's
+# updates are handled one at a time, in arrival order, against fresh state.
+# Same as aiogram's SimpleEventIsolation, except idle locks are dropped
+# instead of kept for every user ever seen.
+class KeyedEventIsolation(BaseEventIsolation):
+    def __init__(self):
+        self.keys = KeyedLock()
+
+    @asynccontextmanager
+    async def lock(self, key):
+        async with self.keys.hold(key):
+            yield
+
+    async def close(self):
+        pass
+
+
+# Remembers when each user was last told an update of theirs was dropped, so
+# a user mashing buttons gets one notice per interval, not one per update.
+class Notices:
+    def __init__(self, interval, maxsize=10000):
+        self.interval = interval
+        self.sent = LRUCache(maxsize)
+
+    def due(self, key):
+        now = time.monotonic()
+        last = self.sent.peek(key)
+        if last is not None and now - last < self.interval:
+            return False
+        self.sent.set(key, now)
+        return True
+
+
+async def notify(update, text):
+    # Group chatter is dropped silently; private chats and buttons get a reply.
+    try:
+        if update.callback_query is not None:
+            await update.callback_query.answer(text)
+        elif update.message is not None and update.message.chat.type == "private":
+            await update.message.answer(text)
+    except TelegramAPIError as e:
+        logger.warning("Could not deliver notice to update %s: %s", update.update_id, e)
+
+
+def _command(update):
+    if update.message is not None and update.message.text:
+        text = update.message.text
+        return text.split(maxsplit=1)[0].split('@')[0] if text.startswith('/') else text
+    if update.callback_query is not None:
+        return update.callback_query.data
+    return None
+
+
+# Outer update middleware, registered ahead of the dispatcher's FSM middleware
+# so a throttled update is rejected before it loads FSM state, waits for a
+# lock, runs a filter or touches the database. Every user gets a token bucket of `burst` updates
+# refilled at `rate` per second; message texts, commands or callback data
+# listed in `cooldowns` can additionally run only once per that many seconds.
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, rate=1, burst=10, cooldowns=None, notice_interval=10, max_users=10000):
+        self.rate = rate
+        self.burst = burst
+        self.cooldowns = cooldowns or {}
+        self.buckets = LRUCache(max_users)
+        self.last_used = LRUCache(max_users)
+        self.notices = Notices(notice_interval, max_users)
+        self.throttled = 0
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+        command = _command(event)
+        cooldown = self.cooldowns.get(command)
+        now = time.monotonic()
+        if cooldown:
+            used = self.last_used.peek((user.id, command))
+            if used is not None and now - used < cooldown:
+                return await self._reject(event, user.id, COOLDOWN.format(seconds=math.ceil(cooldown - (now - used))))
+        bucket = self.buckets.peek(user.id)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            self.buckets.set(user.id, bucket)
+        if not bucket.consume():
+            return await self._reject(event, user.id, SLOW_DOWN)
+        if cooldown:
+            self.last_used.set((user.id, command), now)
+        return await handler(event, data)
+
+    async def _reject(self, event, user_id, text):
+        self.throttled += 1
+        if self.notices.due(user_id):
+            await notify(event, text)
+        return None
+
+
+# Outer update middleware, registered after the dispatcher's FSM middleware.
+# Updates are already handled as concurrent tasks (polling's handle_as_tasks,
+# the webhook's background handling), and KeyedEventIsolation already runs
+# one user's updates one at a time. This caps how many handlers run at once
+# across users at `limit`; beyond `max_waiting` queued updates, new ones are
+# dropped instead of piling up, and their senders are told the bot is busy.
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    def __init__(self, limit=64, max_waiting=1000, notice_interval=30):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.shed = 0
+        self.notices = Notices(notice_interval)
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        chat = data.get('event_chat')
+        key = user.id if user else chat.id if chat else None
+        if self.waiting >= self.max_waiting:
+            self.shed += 1
+            logger.warning("Dropping update %s from %s: %d updates already waiting",
+                           event.update_id, key, self.waiting)
+            if key is not None and self.notices.due(key):
+                await notify(event, OVERLOADED)
+            return None
+        self.waiting += 1
+        acquired = False
+        try:
+            async with self.semaphore:
+                self.waiting -= 1
+                acquired = True
+                self.in_flight += 1
+                try:
+                    return await handler(event, data)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if not acquired:
+                self.waiting -= 1
@@ -1,3 +1,39 @@
 TOKEN = "7503387130:AAER4rZXoz9PSL8U7wKuV4tpHRP12PABMDs"
 GROUP_CHAT_ID = '-1002125753894'
-YOUR_ADMIN_ID = '1274378031'
\ No newline at end of file
+YOUR_ADMIN_ID = '1274378031'
+
+# Webhook mode (long polling is used when USE_WEBHOOK is False)
+USE_WEBHOOK = False
+WEBHOOK_URL = ''  # public base URL, e.g. https://bot.example.com; leave empty to skip setWebhook
+WEBHOOK_PATH = '/webhook'
+WEBHOOK_SECRET = ''
+WEBAPP_HOST = '0.0.0.0'
+WEBAPP_PORT = 8080
+
+# Prometheus metrics, served on a local /metrics endpoint in both polling and webhook mode
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9100  # None disables the local metrics server
+SLOW_QUERY_MS = 100  # log database calls slower than this; None disables
+
+# SQLite storage
+DATABASE_PATH = 'book_club.db'
+DB_READERS = 4  # read-only connections next to the single writer
+
+# Update processing: updates from one user run in order, different users in parallel
+UPDATE_CONCURRENCY = 64  # handlers running at once
+UPDATE_QUEUE_LIMIT = 1000  # updates allowed to wait before new ones are dropped
+
+# Clubs: GROUP_CHAT_ID is the default club; more are added with /addclub in their group
+DEFAULT_CLUB_ID = int(GROUP_CHAT_ID)
+REPORT_JITTER = 600  # seconds; spreads each club's scheduled reports after the cron time
+REPORT_CONCURRENCY = 8  # club reports rendered at once
+
+# /stats charts
+CHART_WORKERS = 2  # processes rendering charts off the event loop
+CHART_DAYS = 30  # days shown in the pages-per-day chart
+
+# Per-user throttling
+THROTTLE_RATE = 1  # updates per second refilled into each user's bucket
+THROTTLE_BURST = 10  # updates a user can send back to back
+REPORT_CACHE_TTL = 30  # seconds an overall report is reused for the same club
+REPORT_CACHE_PAGES = 20  # longer overall reports are streamed every time instead of cached
@@ -1,146 +1,446 @@
+import asyncio
 import sqlite3
+from contextlib import asynccontextmanager
 from datetime import datetime
-from config import YOUR_ADMIN_ID
+from pathlib import Path
+import aiosqlite
+from cache import LRUCache, MISSING
+from config import YOUR_ADMIN_ID, DATABASE_PATH, DB_READERS, DEFAULT_CLUB_ID
+from migrations import migrate, migrate_async
 
+# WAL lets the read-only connections run while the writer commits, and with
+# WAL synchronous=NORMAL only fsyncs at checkpoints instead of every commit.
+WRITER_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA temp_store = MEMORY',
+]
+READER_PRAGMAS = [
+    'PRAGMA query_only = 1',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -8000',
+    'PRAGMA temp_store = MEMORY',
+]
+
+# The club a row belongs to is looked up inside the writing statement, so it
+# always matches the member's club at the time of the write.
+USER_CLUB = '(SELECT club_id FROM users WHERE user_id = :user_id)'
+
+# reading_sessions is the append-only source of truth; the daily, weekly and
+# all-time rollups are bumped in the same transaction as each session insert.
+RECORD_SESSION = [
+    f'''INSERT INTO reading_sessions (user_id, book_name, from_page, to_page, pages, created_at, club_id)
+        VALUES (:user_id, :book_name, :from_page, :to_page, :pages, :created_at, {USER_CLUB})''',
+    f'''INSERT INTO daily_reading (user_id, date, pages_read, club_id) VALUES (:user_id, :date, :pages, {USER_CLUB})
+        ON CONFLICT (user_id, club_id, date) DO UPDATE SET pages_read = pages_read + excluded.pages_read''',
+    f'''INSERT INTO weekly_reading (user_id, week, pages_read, club_id) VALUES (:user_id, :week, :pages, {USER_CLUB})
+        ON CONFLICT (user_id, club_id, week) DO UPDATE SET pages_read = pages_read + excluded.pages_read''',
+    f'''INSERT INTO reading_totals (user_id, club_id, pages_read, sessions, last_read_at)
+        VALUES (:user_id, {USER_CLUB}, :pages, 1, :created_at)
+        ON CONFLICT (user_id, club_id) DO UPDATE SET pages_read = pages_read + excluded.pages_read,
+                                                     sessions = sessions + 1,
+                                                     last_read_at = excluded.last_read_at''',
+]
+
+# Child rows first, the users row last, all in one transaction.
+DELETE_USER = [
+    'DELETE FROM books WHERE user_id = ?',
+    'DELETE FROM daily_reading WHERE user_id = ?',
+    'DELETE FROM weekly_reading WHERE user_id = ?',
+    'DELETE FROM reading_sessions WHERE user_id = ?',
+    'DELETE FROM reading_totals WHERE user_id = ?',
+    'DELETE FROM users WHERE user_id = ?',
+]
+
+
+INSERT_BOOK = f'''INSERT INTO books (user_id, book_name, start_page, last_page, finished, club_id)
+                  VALUES (:user_id, :book_name, :start_page, :last_page, :finished, {USER_CLUB})'''
+
+# A member who follows another club's invite moves there with their books;
+# stats they already earned stay with the club they earned them in.
+MOVE_USER = [
+    'UPDATE users SET club_id = :club_id WHERE user_id = :user_id',
+    'UPDATE books SET club_id = :club_id WHERE user_id = :user_id',
+]
+
+MIN_PAGES = 10
+
+
+def check_progress(last_page, previous_last_page=None):
+    # Returns the message to show the reader, or None if the report is valid.
+    if previous_last_page is not None:
+        if last_page - previous_last_page < MIN_PAGES:
+            return f"Please enter a valid page number that is at least {MIN_PAGES} pages more than {previous_last_page}."
+    elif last_page < MIN_PAGES:
+        return f"You must read at least {MIN_PAGES} pages."
+    return None
+
+
+def session_params(user_id, book_name, from_page, to_page):
+    now = datetime.now()
+    return {
+        'user_id': user_id,
+        'book_name': book_name,
+        'from_page': from_page,
+        'to_page': to_page,
+        'pages': to_page - from_page,
+        'created_at': now.isoformat(timespec='seconds'),
+        'date': now.strftime('%Y-%m-%d'),
+        'week': now.strftime('%Y-%W'),
+    }
+
+
+# Synchronous connection used by offline tools such as archive.py: it opens the
+# database with the writer pragmas and brings the schema up to date. The bot
+# itself goes through AsyncDatabase.
 class Database:
-    def __init__(self):
-        self.conn = sqlite3.connect('book_club.db')
-        self.create_tables()
-
-    def create_tables(self):
-        with self.conn:
-            self.conn.execute('''CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                name TEXT NOT NULL,
-                username TEXT,
-                is_active INTEGER DEFAULT 1,
-                is_admin INTEGER DEFAULT 0
-            )''')
-            self.conn.execute('''CREATE TABLE IF NOT EXISTS books (
-                user_id INTEGER,
-                book_name TEXT,
-                start_page INTEGER,
-                last_page INTEGER,
-                finished INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, book_name),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )''')
-            self.conn.execute('''CREATE TABLE IF NOT EXISTS daily_reading (
-                user_id INTEGER,
-                date TEXT,
-                pages_read INTEGER,
-                PRIMARY KEY (user_id, date),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )''')
-            self.conn.execute('''CREATE TABLE IF NOT EXISTS weekly_reading (
-                user_id INTEGER,
-                week TEXT,
-                pages_read INTEGER,
-                PRIMARY KEY (user_id, week),
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )''')
-
-    def add_user(self, user_id, name, username):
-        with self.conn:
-            self.conn.execute('INSERT OR REPLACE INTO users (user_id, name, username, is_active, is_admin) VALUES (?, ?, ?, 1, ?)',
-                           (user_id, name, username, 1 if str(user_id) == YOUR_ADMIN_ID else 0))
-
-    def get_user(self, user_id):
-        return self.conn.execute('SELECT * FROM users WHERE user_id = ?', (user_id,)).fetchone()
-
-    def get_all_users(self):
-        return self.conn.execute('SELECT * FROM users').fetchall()
-
-    def is_user_active(self, user_id):
-        user = self.get_user(user_id)
+    def __init__(self, path=DATABASE_PATH):
+        self.conn = sqlite3.connect(path)
+        for pragma in WRITER_PRAGMAS:
+            self.conn.execute(pragma)
+        migrate(self.conn)
+
+
+class BookIndex:
+    def __init__(self, rows):
+        self.by_name = {row[1]: row for row in rows}
+        self.unfinished = tuple(row[1] for row in rows if not row[4])
+
+    def replace(self, row):
+        rows = dict(self.by_name)
+        rows[row[1]] = row
+        return BookIndex(list(rows.values()))
+
+
+# Non-blocking database used by the bot handlers. Writes go through
+# transaction(), which holds self.lock so commits from concurrent handlers
+# never interleave on the single writer connection. Reads borrow one
+# of `readers` read-only connections, so they never queue behind a write.
+class AsyncDatabase:
+    def __init__(self, path=DATABASE_PATH, readers=DB_READERS, user_cache_size=4096, book_cache_size=4096):
+        self.path = path
+        self.conn = None
+        self.lock = asyncio.Lock()
+        self.reader_count = readers
+        self.readers = None
+        # User rows keyed by user_id; None marks a known-missing user.
+        self.user_cache = LRUCache(user_cache_size)
+        self.user_cache_version = 0
+        # BookIndex per user_id; replaced (never mutated) when the user's books change.
+        self.book_cache = LRUCache(book_cache_size)
+        self.book_cache_version = 0
+
+    async def connect(self):
+        self.conn = await aiosqlite.connect(self.path)
+        for pragma in WRITER_PRAGMAS:
+            await self.conn.execute(pragma)
+        await self.create_tables()
+        self.readers = asyncio.Queue()
+        if self.path == ':memory:':
+            return
+        uri = Path(self.path).resolve().as_uri() + '?mode=ro'
+        for _ in range(self.reader_count):
+            reader = await aiosqlite.connect(uri, uri=True)
+            for pragma in READER_PRAGMAS:
+                await reader.execute(pragma)
+            self.readers.put_nowait(reader)
+
+    async def close(self):
+        while self.readers is not None and not self.readers.empty():
+            await self.readers.get_nowait().close()
+        self.readers = None
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    @asynccontextmanager
+    async def reader(self):
+        if not self.reader_count or self.path == ':memory:':
+            yield self.conn
+            return
+        conn = await self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.lock:
+            try:
+                yield self.conn
+            except BaseException:
+                await self.conn.rollback()
+                raise
+            await self.conn.commit()
+
+    async def fetchone(self, sql, params=()):
+        async with self.reader() as conn, conn.execute(sql, params) as cursor:
+            return await cursor.fetchone()
+
+    async def fetchall(self, sql, params=()):
+        async with self.reader() as conn, conn.execute(sql, params) as cursor:
+            return await cursor.fetchall()
+
+    async def create_tables(self):
+        async with self.lock:
+            await migrate_async(self.conn)
+
+    def _cache_user(self, user_id, user):
+        self.user_cache_version += 1
+        self.user_cache.set(user_id, user)
+
+    def _patch_cached_user(self, user_id, index, value):
+        self.user_cache_version += 1
+        user = self.user_cache.peek(user_id)
+        if user is not None:
+            user = list(user)
+            user[index] = value
+            self.user_cache.set(user_id, tuple(user))
+
+    def _evict_user(self, user_id):
+        self.user_cache_version += 1
+        self.user_cache.pop(user_id)
+
+    async def add_club(self, club_id, title):
+        async with self.transaction() as conn:
+            await conn.execute('''INSERT INTO clubs (club_id, title, is_active) VALUES (?, ?, 1)
+                                  ON CONFLICT (club_id) DO UPDATE SET title = excluded.title, is_active = 1''',
+                               (club_id, title))
+
+    async def get_club(self, club_id):
+        return await self.fetchone('SELECT * FROM clubs WHERE club_id = ?', (club_id,))
+
+    async def get_clubs(self):
+        return await self.fetchall('SELECT * FROM clubs WHERE is_active = 1 ORDER BY club_id')
+
+    async def add_user(self, user_id, name, username, club_id=DEFAULT_CLUB_ID):
+        user = (user_id, name, username, 1, 1 if str(user_id) == YOUR_ADMIN_ID else 0, club_id)
+        async with self.transaction() as conn:
+            await conn.execute('INSERT OR REPLACE INTO users (user_id, name, username, is_active, is_admin, club_id) VALUES (?, ?, ?, ?, ?, ?)',
+                               user)
+        self._cache_user(user_id, user)
+
+    async def move_user(self, user_id, club_id):
+        async with self.transaction() as conn:
+            for statement in MOVE_USER:
+                await conn.execute(statement, {'user_id': user_id, 'club_id': club_id})
+        self._patch_cached_user(user_id, 5, club_id)
+
+    async def get_user(self, user_id):
+        user = self.user_cache.get(user_id)
+        if user is not MISSING:
+            return user
+        version = self.user_cache_version
+        user = await self.fetchone('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        # A write that landed while we were querying may have made this row stale.
+        if version == self.user_cache_version:
+            self.user_cache.set(user_id, user)
+        return user
+
+    async def get_users_page(self, club_id, after_id=None, before_id=None, limit=10, prefix=None):
+        # Keyset pagination on user_id; returns (rows, more) where `more` says
+        # whether another page exists past the last row in paging direction.
+        conditions, params = ['club_id = ?'], [club_id]
+        if before_id is not None:
+            conditions.append('user_id < ?')
+            params.append(before_id)
+        elif after_id is not None:
+            conditions.append('user_id > ?')
+            params.append(after_id)
+        if prefix:
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append(escaped + '%')
+        order = 'DESC' if before_id is not None else 'ASC'
+        rows = await self.fetchall(f'SELECT * FROM users WHERE {" AND ".join(conditions)} ORDER BY user_id {order} LIMIT ?', (*params, limit + 1))
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if before_id is not None:
+            rows.reverse()
+        return rows, more
+
+    async def is_user_active(self, user_id):
+        user = await self.get_user(user_id)
         return user[3] if user else False
 
-    def activate_user(self, user_id):
-        with self.conn:
-            self.conn.execute('UPDATE users SET is_active = 1 WHERE user_id = ?', (user_id,))
+    async def activate_user(self, user_id):
+        async with self.transaction() as conn:
+            await conn.execute('UPDATE users SET is_active = 1 WHERE user_id = ?', (user_id,))
+        self._patch_cached_user(user_id, 3, 1)
 
-    def deactivate_user(self, user_id):
-        with self.conn:
-            self.conn.execute('UPDATE users SET is_active = 0 WHERE user_id = ?', (user_id,))
+    async def deactivate_user(self, user_id):
+        async with self.transaction() as conn:
+            await conn.execute('UPDATE users SET is_active = 0 WHERE user_id = ?', (user_id,))
+        self._patch_cached_user(user_id, 3, 0)
 
-    def is_admin(self, user_id):
-        user = self.get_user(user_id)
+    async def is_admin(self, user_id):
+        user = await self.get_user(user_id)
         return user[4] if user else False
 
-    def add_book(self, user_id, book_name, start_page, last_page, finished):
-        with self.conn:
-            self.conn.execute('INSERT INTO books (user_id, book_name, start_page, last_page, finished) VALUES (?, ?, ?, ?, ?)',
-                           (user_id, book_name, start_page, last_page, finished))
-            self.update_reading_stats(user_id, last_page - start_page)
-
-    def update_book_progress(self, user_id, book_name, last_page, finished):
-        with self.conn:
-            current = self.conn.execute('SELECT last_page FROM books WHERE user_id = ? AND book_name = ?',
-                                     (user_id, book_name)).fetchone()
-            if current:
-                pages = last_page - current[0]
-                self.conn.execute('UPDATE books SET start_page = last_page, last_page = ?, finished = ? WHERE user_id = ? AND book_name = ?',
+    def _update_book_index(self, user_id, book):
+        self.book_cache_version += 1
+        books = self.book_cache.peek(user_id)
+        if books is not None:
+            self.book_cache.set(user_id, books.replace(book))
+
+    async def add_book(self, user_id, book_name, start_page, last_page, finished):
+        async with self.transaction() as conn:
+            await conn.execute(INSERT_BOOK, {'user_id': user_id, 'book_name': book_name, 'start_page': start_page,
+                                             'last_page': last_page, 'finished': finished})
+            await self._record_session(conn, user_id, book_name, start_page, last_page)
+        self._update_book_index(user_id, (user_id, book_name, start_page, last_page, int(finished)))
+
+    async def update_book_progress(self, user_id, book_name, last_page, finished):
+        async with self.transaction() as conn:
+            async with conn.execute('SELECT last_page FROM books WHERE user_id = ? AND book_name = ?',
+                                    (user_id, book_name)) as cursor:
+                current = await cursor.fetchone()
+            if not current:
+                return
+            await conn.execute('UPDATE books SET start_page = last_page, last_page = ?, finished = ? WHERE user_id = ? AND book_name = ?',
                                (last_page, finished, user_id, book_name))
-                self.update_reading_stats(user_id, pages)
+            await self._record_session(conn, user_id, book_name, current[0], last_page)
+        self._update_book_index(user_id, (user_id, book_name, current[0], last_page, int(finished)))
 
-    def mark_book_finished(self, user_id, book_name):
-        with self.conn:
-            self.conn.execute('UPDATE books SET finished = 1 WHERE user_id = ? AND book_name = ?',
-                           (user_id, book_name))
+    async def get_book_index(self, user_id):
+        books = self.book_cache.get(user_id)
+        if books is not MISSING:
+            return books
+        version = self.book_cache_version
+        books = BookIndex(await self.fetchall('SELECT user_id, book_name, start_page, last_page, finished FROM books WHERE user_id = ?',
+                                              (user_id,)))
+        if version == self.book_cache_version:
+            self.book_cache.set(user_id, books)
+        return books
 
-    def get_user_books(self, user_id):
-        return self.conn.execute('SELECT * FROM books WHERE user_id = ?', (user_id,)).fetchall()
+    async def get_book(self, user_id, book_name):
+        return (await self.get_book_index(user_id)).by_name.get(book_name)
 
-    def get_book(self, user_id, book_name):
-        return self.conn.execute('SELECT * FROM books WHERE user_id = ? AND book_name = ?',
-                               (user_id, book_name)).fetchone()
+    async def _record_session(self, conn, user_id, book_name, from_page, to_page):
+        params = session_params(user_id, book_name, from_page, to_page)
+        for statement in RECORD_SESSION:
+            await conn.execute(statement, params)
 
-    def update_reading_stats(self, user_id, pages):
-        today = datetime.now().strftime('%Y-%m-%d')
-        week = datetime.now().strftime('%Y-%W')
-        with self.conn:
-            cursor = self.conn.execute('SELECT pages_read FROM daily_reading WHERE user_id = ? AND date = ?',
-                                    (user_id, today))
-            current_pages = cursor.fetchone()
-            new_pages = pages + (current_pages[0] if current_pages else 0)
-            self.conn.execute('INSERT OR REPLACE INTO daily_reading (user_id, date, pages_read) VALUES (?, ?, ?)',
-                           (user_id, today, new_pages))
-            cursor = self.conn.execute('SELECT pages_read FROM weekly_reading WHERE user_id = ? AND week = ?',
-                                    (user_id, week))
-            current_week_pages = cursor.fetchone()
-            new_week_pages = pages + (current_week_pages[0] if current_week_pages else 0)
-            self.conn.execute('INSERT OR REPLACE INTO weekly_reading (user_id, week, pages_read) VALUES (?, ?, ?)',
-                           (user_id, week, new_week_pages))
-
-    def get_daily_reading(self, user_id):
-        today = datetime.now().strftime('%Y-%m-%d')
-        result = self.conn.execute('SELECT pages_read FROM daily_reading WHERE user_id = ? AND date = ?',
-                                 (user_id, today)).fetchone()
-        return result[0] if result else 0
+    # Query side of the session log; with get_reading_totals, what history
+    # views read instead of the rollup tables.
+    async def get_reading_history(self, user_id, since=None):
+        return await self.fetchall('''
+            SELECT book_name, from_page, to_page, pages, created_at
+            FROM reading_sessions
+            WHERE user_id = ? AND created_at >= ?
+            ORDER BY id
+        ''', (user_id, since or ''))
 
-    def clear_daily(self):
-        today = datetime.now().strftime('%Y-%m-%d')
-        with self.conn:
-            self.conn.execute('DELETE FROM daily_reading WHERE date != ?', (today,))
+    async def get_last_session_id(self, user_id):
+        result = await self.fetchone('SELECT MAX(id) FROM reading_sessions WHERE user_id = ?', (user_id,))
+        return result[0]
+
+    async def get_pages_per_day(self, user_id, since):
+        return await self.fetchall('''
+            SELECT substr(created_at, 1, 10) AS day, SUM(pages)
+            FROM reading_sessions
+            WHERE user_id = ? AND created_at >= ?
+            GROUP BY day
+            ORDER BY day
+        ''', (user_id, since))
+
+    async def get_book_timeline(self, user_id, limit=20):
+        # (book, first session, last session, finished) for the most recently read books.
+        return await self.fetchall('''
+            SELECT s.book_name, MIN(s.created_at), MAX(s.created_at), COALESCE(MAX(b.finished), 0)
+            FROM reading_sessions s
+            LEFT JOIN books b ON b.user_id = s.user_id AND b.book_name = s.book_name
+            WHERE s.user_id = ?
+            GROUP BY s.book_name
+            ORDER BY MAX(s.created_at) DESC
+            LIMIT ?
+        ''', (user_id, limit))
+
+    # All-time totals across every club the member has read in.
+    async def get_reading_totals(self, user_id):
+        return await self.fetchone('''
+            SELECT SUM(pages_read), SUM(sessions), MAX(last_read_at)
+            FROM reading_totals
+            WHERE user_id = ?
+            GROUP BY user_id
+        ''', (user_id,))
 
-    def clear_weekly(self):
-        with self.conn:
-            self.conn.execute('DELETE FROM weekly_reading')
+    # Club reports below read only their club's rows, through the club_id indexes.
+    # Rows are fetched batch_size members at a time and the reader goes back to
+    # the pool between batches, so a consumer that is slow between rows (one
+    # Telegram send per page) never holds a pooled connection while it waits.
+    async def iter_users_with_books(self, club_id, batch_size=200):
+        after_id = None
+        while True:
+            rows = await self.fetchall('''
+                SELECT u.user_id, u.name, u.username, b.book_name, b.start_page, b.last_page, b.finished
+                FROM (SELECT user_id, name, username FROM users
+                      WHERE club_id = ?1 AND (?2 IS NULL OR user_id > ?2)
+                      ORDER BY user_id
+                      LIMIT ?3) u
+                LEFT JOIN books b ON b.user_id = u.user_id
+                ORDER BY u.user_id
+            ''', (club_id, after_id, batch_size))
+            for row in rows:
+                yield row
+            if not rows:
+                return
+            after_id = rows[-1][0]
 
-    def get_top_reader(self):
+    async def get_club_last_session_id(self, club_id):
+        result = await self.fetchone('SELECT MAX(id) FROM reading_sessions WHERE club_id = ?', (club_id,))
+        return result[0]
+
+    async def get_club_pages_per_day(self, club_id, since):
+        return await self.fetchall('''
+            SELECT substr(created_at, 1, 10) AS day, SUM(pages)
+            FROM reading_sessions
+            WHERE club_id = ? AND created_at >= ?
+            GROUP BY day
+            ORDER BY day
+        ''', (club_id, since))
+
+    async def get_club_book_timeline(self, club_id, since, limit=20):
+        return await self.fetchall('''
+            SELECT u.name || ': ' || s.book_name, MIN(s.created_at), MAX(s.created_at), COALESCE(MAX(b.finished), 0)
+            FROM reading_sessions s
+            JOIN users u ON u.user_id = s.user_id
+            LEFT JOIN books b ON b.user_id = s.user_id AND b.book_name = s.book_name
+            WHERE s.club_id = ? AND s.created_at >= ?
+            GROUP BY s.user_id, s.book_name
+            ORDER BY MAX(s.created_at) DESC
+            LIMIT ?
+        ''', (club_id, since, limit))
+
+    async def get_daily_summary(self, club_id):
+        today = datetime.now().strftime('%Y-%m-%d')
+        return await self.fetchall('''
+            SELECT u.user_id, u.name, u.username, COALESCE(d.pages_read, 0)
+            FROM users u
+            LEFT JOIN daily_reading d ON d.user_id = u.user_id AND d.date = ? AND d.club_id = u.club_id
+            WHERE u.club_id = ? AND u.is_active = 1
+            ORDER BY u.user_id
+        ''', (today, club_id))
+
+    async def get_weekly_summary(self, club_id, limit=10):
         week = datetime.now().strftime('%Y-%W')
-        return self.conn.execute('''
-            SELECT u.user_id, u.name, u.username 
-            FROM weekly_reading w 
-            JOIN users u ON w.user_id = u.user_id 
-            WHERE w.week = ? 
-            ORDER BY w.pages_read DESC 
-            LIMIT 1
-        ''', (week,)).fetchone()
-
-    def delete_user(self, user_id):
-        with self.conn:
-            self.conn.execute('DELETE FROM users WHERE user_id = ?', (user_id,))
-            self.conn.execute('DELETE FROM books WHERE user_id = ?', (user_id,))
-            self.conn.execute('DELETE FROM daily_reading WHERE user_id = ?', (user_id,))
-            self.conn.execute('DELETE FROM weekly_reading WHERE user_id = ?', (user_id,))
\ No newline at end of file
+        return await self.fetchall('''
+            SELECT u.user_id, u.name, u.username, COALESCE(w.pages_read, 0) AS pages,
+                   RANK() OVER (ORDER BY COALESCE(w.pages_read, 0) DESC)
+            FROM users u
+            LEFT JOIN weekly_reading w ON w.user_id = u.user_id AND w.week = ? AND w.club_id = u.club_id
+            WHERE u.club_id = ? AND u.is_active = 1
+            ORDER BY pages DESC, u.user_id
+            LIMIT ?
+        ''', (week, club_id, limit))
+
+    async def delete_user(self, user_id):
+        async with self.transaction() as conn:
+            for statement in DELETE_USER:
+                await conn.execute(statement, (user_id,))
+        self._evict_user(user_id)
+        self.book_cache_version += 1
+        self.book_cache.pop(user_id)
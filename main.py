@@ -1,16 +1,29 @@
 import asyncio
 import logging
-import sqlite3
-from datetime import datetime
+from contextlib import aclosing
 from aiogram import Bot, Dispatcher, types
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.filters import CommandStart
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
+from aiogram.filters import Command, CommandObject, CommandStart
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.context import FSMContext
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from config import TOKEN, GROUP_CHAT_ID
-from database import Database
+from config import (TOKEN, DEFAULT_CLUB_ID, REPORT_JITTER, REPORT_CONCURRENCY, USE_WEBHOOK, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+                    WEBAPP_HOST, WEBAPP_PORT, METRICS_HOST, METRICS_PORT, SLOW_QUERY_MS,
+                    UPDATE_CONCURRENCY, UPDATE_QUEUE_LIMIT, THROTTLE_RATE, THROTTLE_BURST, REPORT_CACHE_TTL, REPORT_CACHE_PAGES)
+from cache import SharedStream
+from charts import Charts
+from concurrency import ConcurrencyLimitMiddleware, KeyedEventIsolation, ThrottlingMiddleware
+from database import AsyncDatabase, check_progress
+from metrics import (Gauge, MetricsMiddleware, RequestMetricsMiddleware, instrument_database,
+                     start_metrics_server, timed_job)
+from rendering import (MAIN_KEYBOARD, ADMIN_KEYBOARD, JOIN_AGAIN_KEYBOARD, LOGGED_OUT_KEYBOARD, BOOK_STATUS_KEYBOARD,
+                       SEND_REPORT_KEYBOARD, books_keyboard, reading_report)
+from reports import daily_blocks, overall_blocks, paginate
+from sender import MessageQueue
+from storage import SQLiteStorage
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
@@ -20,8 +33,41 @@ logger = logging.getLogger(__name__)
 
 # Bot and Dispatcher initialization
 bot = Bot(token=TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher(storage=MemoryStorage())
-db = Database()
+db = instrument_database(AsyncDatabase(), slow_query_ms=SLOW_QUERY_MS)
+storage = SQLiteStorage(db)
+dp = Dispatcher(storage=storage, events_isolation=KeyedEventIsolation())
+outbox = MessageQueue(bot)
+scheduler = AsyncIOScheduler()
+report_slots = asyncio.Semaphore(REPORT_CONCURRENCY)
+charts = Charts(db)
+overall_reports = SharedStream(REPORT_CACHE_TTL, max_items=REPORT_CACHE_PAGES)
+
+# Seconds between runs of the expensive commands, per user.
+COOLDOWNS = {"Overall result 📊": 10, "/stats": 10}
+STALE_REPORT = "This report is no longer open. Start again from the menu."
+
+throttling = ThrottlingMiddleware(rate=THROTTLE_RATE, burst=THROTTLE_BURST, cooldowns=COOLDOWNS)
+limiter = ConcurrencyLimitMiddleware(limit=UPDATE_CONCURRENCY, max_waiting=UPDATE_QUEUE_LIMIT)
+# Throttling goes ahead of the dispatcher's FSM middleware, so a rejected
+# update never loads FSM state; the limiter runs after it, inside the user lock.
+dp.update.outer_middleware.unregister(dp.fsm)
+dp.update.outer_middleware(throttling)
+dp.update.outer_middleware(dp.fsm)
+dp.update.outer_middleware(limiter)
+dp.message.middleware(MetricsMiddleware())
+dp.callback_query.middleware(MetricsMiddleware())
+Gauge('bookclub_outbox_depth', "Group messages waiting to be sent", outbox.depth)
+Gauge('bookclub_updates_in_flight', "Updates being handled", lambda: limiter.in_flight)
+Gauge('bookclub_updates_waiting', "Updates queued behind the concurrency limit", lambda: limiter.waiting)
+Gauge('bookclub_updates_shed_total', "Updates dropped because the queue was full", lambda: limiter.shed, kind='counter')
+Gauge('bookclub_updates_throttled_total', "Updates dropped by per-user rate limits", lambda: throttling.throttled,
+      kind='counter')
+Gauge('bookclub_fsm_entries', "FSM states held in memory", lambda: len(storage.entries))
+Gauge('bookclub_user_cache_hits_total', "User cache hits", lambda: db.user_cache.hits, kind='counter')
+Gauge('bookclub_user_cache_misses_total', "User cache misses", lambda: db.user_cache.misses, kind='counter')
+Gauge('bookclub_book_cache_hits_total', "Book index cache hits", lambda: db.book_cache.hits, kind='counter')
+Gauge('bookclub_book_cache_misses_total', "Book index cache misses", lambda: db.book_cache.misses, kind='counter')
+Gauge('bookclub_chart_renders_total', "Stats charts rendered", lambda: charts.renders, kind='counter')
 
 # States for FSM
 class UserStates(StatesGroup):
@@ -33,100 +79,131 @@ class UserStates(StatesGroup):
     waiting_for_admin_delete = State()
 
 # Keyboards
-def get_main_keyboard():
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Today have read 📚"), KeyboardButton(text="Log out 🚪")]
-        ],
-        resize_keyboard=True
-    )
-    return keyboard
-
-def get_admin_keyboard():
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Today have read 📚"), KeyboardButton(text="Log out 🚪")],
-            [KeyboardButton(text="Overall result 📊"), KeyboardButton(text="Delete users 🗑")]
-        ],
-        resize_keyboard=True
-    )
-    return keyboard
-
 async def get_books_keyboard(user_id):
-    books = db.get_user_books(user_id)
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=book[1])] for book in books if not book[4]  # Add buttons for unfinished books
-        ] + [[KeyboardButton(text="+ add new one  📕")]],  # Add the "+ add new one  📕" button as a separate row
-        resize_keyboard=True
-    )
-    return keyboard
+    return books_keyboard(user_id, await db.get_book_index(user_id))
+
+# Fixed menu texts map straight to their handlers, so a menu press costs one
+# dict lookup instead of a walk through one filter per button.
+MENU = {}
+
+def menu_item(*texts):
+    def register(handler):
+        for text in texts:
+            MENU[text] = handler
+        return handler
+    return register
+
+async def user_book(message: types.Message):
+    books = await db.get_book_index(message.from_user.id)
+    book = books.by_name.get(message.text) if books.by_name else None
+    return {"book": book} if book else False
+
+async def invited_club(command: CommandObject):
+    # /start <club_id> deep links come from the invite posted by /addclub.
+    try:
+        club = await db.get_club(int(command.args))
+    except (TypeError, ValueError):
+        return None
+    return club[0] if club and club[2] else None
 
 # Handlers
 @dp.message(CommandStart())
-async def start_command(message: types.Message, state: FSMContext):
+async def start_command(message: types.Message, state: FSMContext, command: CommandObject):
     user_id = message.from_user.id
-    if str(message.chat.id) == GROUP_CHAT_ID:
+    if message.chat.type != "private":
         return
-    if db.get_user(user_id):
-        if db.is_user_active(user_id):
-            if db.is_admin(user_id):
-                await message.answer("👋 Welcome back, Admin!", reply_markup=get_admin_keyboard())
+    club_id = await invited_club(command)
+    user = await db.get_user(user_id)
+    if user:
+        if club_id is not None and club_id != user[5]:
+            await db.move_user(user_id, club_id)
+            await message.answer("You have moved to a new club 📚")
+        if await db.is_user_active(user_id):
+            if await db.is_admin(user_id):
+                await message.answer("👋 Welcome back, Admin!", reply_markup=ADMIN_KEYBOARD)
                 return
-            await message.answer("<b>👋 Welcome back!</b>", reply_markup=get_main_keyboard())
+            await message.answer("<b>👋 Welcome back!</b>", reply_markup=MAIN_KEYBOARD)
         else:
-            keyboard = ReplyKeyboardMarkup(
-                keyboard=[
-                    [KeyboardButton(text="Join again 💠")]
-                ],
-                resize_keyboard=True
-            )
-            await message.answer("You have logged out. Would you like to join again? 🥹", reply_markup=keyboard)
+            await message.answer("You have logged out. Would you like to join again? 🥹", reply_markup=JOIN_AGAIN_KEYBOARD)
     else:
         await message.answer("Welcome to the Book Club! Please enter your name:")
         await state.set_state(UserStates.waiting_for_name)
+        await state.update_data(club_id=club_id or DEFAULT_CLUB_ID)
+
+@dp.message(Command("addclub"))
+async def add_club(message: types.Message):
+    if not await db.is_admin(message.from_user.id):
+        return
+    if message.chat.type not in ("group", "supergroup"):
+        await message.answer("Send /addclub in the group chat that should become a club.")
+        return
+    club_id = message.chat.id
+    await db.add_club(club_id, message.chat.title)
+    schedule_club_reports(club_id)
+    me = await bot.me()
+    await message.answer(f"This chat is now a book club 📚\n\nMembers join here: https://t.me/{me.username}?start={club_id}")
+
+@dp.message(Command("stats"))
+async def stats(message: types.Message):
+    # Private chat: the member's own chart; club group: the whole club's.
+    if message.chat.type == "private":
+        user = await db.get_user(message.from_user.id)
+        if not user:
+            await message.answer("Please /start and join the club first.")
+            return
+        sent = await charts.send_user_chart(bot, message.chat.id, user)
+    else:
+        club = await db.get_club(message.chat.id)
+        if not club:
+            return
+        sent = await charts.send_club_chart(bot, message.chat.id, club)
+    if not sent:
+        await message.answer("No reading recorded yet. Report some pages first 📚")
 
 @dp.message(UserStates.waiting_for_name)
 async def process_name(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     name = message.text
-    db.add_user(user_id, name, message.from_user.username or "N/A")
-    await message.answer(f"Nice to meet you, {name}!", reply_markup=get_main_keyboard())
-    await bot.send_message(GROUP_CHAT_ID, f"Oopppaaaa, yangi kitobxon qo'shildi! 🎉\n\n Kutib olilar: <b>{name}</b>")
+    club_id = (await state.get_data()).get("club_id", DEFAULT_CLUB_ID)
+    await db.add_user(user_id, name, message.from_user.username or "N/A", club_id)
+    await message.answer(f"Nice to meet you, {name}!", reply_markup=MAIN_KEYBOARD)
+    outbox.send(club_id, f"Oopppaaaa, yangi kitobxon qo'shildi! 🎉\n\n Kutib olilar: <b>{name}</b>")
     await state.clear()
 
-@dp.message(lambda message: message.text == "Join again")
-async def join_again(message: types.Message):
+@dp.message(lambda message: message.text in MENU)
+async def menu(message: types.Message, state: FSMContext):
+    await MENU[message.text](message, state)
+
+menu.resolve_name = lambda message: MENU[message.text].__name__
+
+@menu_item("Join again", "Join again 💠")
+async def join_again(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    db.activate_user(user_id)
-    await message.answer("👋 Welcome back!", reply_markup=get_main_keyboard())
-    await bot.send_message(GROUP_CHAT_ID, f"Kimlarni ko'ryapmiz! \n\n<b>{db.get_user()[1]}</b> qaytib keldilar! 🎉")
+    await db.activate_user(user_id)
+    await message.answer("👋 Welcome back!", reply_markup=MAIN_KEYBOARD)
+    user = await db.get_user(user_id)
+    outbox.send(user[5], f"Kimlarni ko'ryapmiz! \n\n<b>{user[1]}</b> qaytib keldilar! 🎉")
 
-@dp.message(lambda message: message.text == "Log out 🚪")
-async def log_out(message: types.Message):
+@menu_item("Log out 🚪")
+async def log_out(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    db.deactivate_user(user_id)
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text="Join again")]
-        ],
-        resize_keyboard=True
-    )
-    await message.answer("You have logged out.", reply_markup=keyboard)
-    await bot.send_message(GROUP_CHAT_ID, f"Og'ir judolik \n\n<b>{db.get_user(user_id)[1]}</b> bizni tark etdilar, umid qilamiz tez orada qaytadilar 👋")
-
-@dp.message(lambda message: message.text == "Today have read 📚")
-async def today_read(message: types.Message):
+    await db.deactivate_user(user_id)
+    await message.answer("You have logged out.", reply_markup=LOGGED_OUT_KEYBOARD)
+    user = await db.get_user(user_id)
+    outbox.send(user[5], f"Og'ir judolik \n\n<b>{user[1]}</b> bizni tark etdilar, umid qilamiz tez orada qaytadilar 👋")
+
+@menu_item("Today have read 📚")
+async def today_read(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    if not db.is_user_active(user_id):
+    if not await db.is_user_active(user_id):
         await message.answer("Please join again first.")
         return
     await message.answer("Select a book or add a new one:", reply_markup=await get_books_keyboard(user_id))
 
-@dp.message(lambda message: message.text == "+ add new one  📕")
+@menu_item("+ add new one  📕")
 async def add_new_book(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    if not db.is_user_active(user_id):
+    if not await db.is_user_active(user_id):
         await message.answer("Please join again first.")
         return
     await message.answer("Enter the name of the book you started:", reply_markup=ReplyKeyboardRemove())
@@ -136,8 +213,7 @@ async def add_new_book(message: types.Message, state: FSMContext):
 async def process_book_name(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
     book_name = message.text
-    books = db.get_user_books(user_id)
-    book = next((b for b in books if b[1] == book_name), None)
+    book = await db.get_book(user_id, book_name)
     if book is not None and book[-1]:
         await message.answer(f"You have already finished reading '{book_name}'. Please select another book or add a new one.", reply_markup=await get_books_keyboard(user_id))
         await state.clear()
@@ -156,32 +232,23 @@ async def process_last_page(message: types.Message, state: FSMContext):
         last_page = int(message.text)
         data = await state.get_data()
         book_name = data.get("book_name")
-        books = db.get_user_books(user_id)
-        book = next((b for b in books if b[1] == book_name), None)
+        book = await db.get_book(user_id, book_name)
         
-        if book:  # Existing book
-            if (last_page - book[3]) < 10:  # Check against previous last_page
-                await message.answer(f"Please enter a valid page number that is at least 10 pages more than {book[3]}.")
-                return
-            await state.update_data(start_page=book[3], last_page=last_page)
-        else:  # New book
-            if last_page < 10:
-                await message.answer("You must read at least 10 pages.")
-                return
-            await state.update_data(start_page=1, last_page=last_page)
+        start_page = book[3] if book else None  # Existing books continue from the previous last_page
+        error = check_progress(last_page, start_page)
+        if error:
+            await message.answer(error)
+            return
+        await state.update_data(start_page=start_page or 1, last_page=last_page)
         
-        keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="Finished", callback_data="book_finished"),
-             InlineKeyboardButton(text="Not finished", callback_data="book_not_finished")]
-        ])
-        await message.answer("Is this book finished?", reply_markup=keyboard)
+        await message.answer("Is this book finished?", reply_markup=BOOK_STATUS_KEYBOARD)
         await state.set_state(UserStates.waiting_for_book_status)
         
     except ValueError:
         await message.answer("Please enter a valid page number.")
         await state.set_state(UserStates.waiting_for_last_page)
 
-@dp.callback_query(lambda c: c.data in ["book_finished", "book_not_finished"])
+@dp.callback_query(UserStates.waiting_for_book_status, lambda c: c.data in ["book_finished", "book_not_finished"])
 async def process_book_status(callback: types.CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     data = await state.get_data()
@@ -189,30 +256,23 @@ async def process_book_status(callback: types.CallbackQuery, state: FSMContext):
     start_page = data.get("start_page")
     last_page = data.get("last_page")
     
-    user = db.get_user(user_id)
+    user = await db.get_user(user_id)
     finished = callback.data == "book_finished"
-    report = (f"👤 Reader name: {user[1]}\n"
-              f"📚 Book name: {book_name}\n"
-              f"💣 From Page: {start_page}\n"
-              f"💣 To Page: {last_page}\n"
-              f"💣 Overall: {last_page - start_page}\n"
-              f"📅 {datetime.now().strftime('%d.%m.%Y')}\n"
-              f"Finished: {'✅ Yes' if finished else '❌ No'}\n"
-              f"📩 @shuhrat9111\n"
-              f"#challange")
+    report = reading_report(user[1], book_name, start_page, last_page, finished)
     
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="Yes", callback_data="send_to_group"),
-         InlineKeyboardButton(text="No", callback_data="dont_send")]
-    ])
-    await callback.message.edit_text(f"Do you want to send this to the group?\n\n{report}", reply_markup=keyboard)
-    await state.update_data(finished=finished)
+    await callback.message.edit_text(f"Do you want to send this to the group?\n\n{report}", reply_markup=SEND_REPORT_KEYBOARD)
+    # The previewed text is what gets sent, so process_group_send needs no second lookup.
+    await state.update_data(finished=finished, report=report, club_id=user[5])
     await state.set_state(UserStates.waiting_for_confirmation)
 
-@dp.callback_query(lambda c: c.data in ["send_to_group", "dont_send"])
+@dp.callback_query(UserStates.waiting_for_confirmation, lambda c: c.data in ["send_to_group", "dont_send"])
 async def process_group_send(callback: types.CallbackQuery, state: FSMContext):
     user_id = callback.from_user.id
     data = await state.get_data()
+    if data.get("report") is None:
+        await callback.answer(STALE_REPORT)
+        await state.clear()
+        return
     book_name = data.get("book_name")
     start_page = data.get("start_page")
     last_page = data.get("last_page")
@@ -220,147 +280,253 @@ async def process_group_send(callback: types.CallbackQuery, state: FSMContext):
     message = "Done!"
     
     if callback.data == "send_to_group":
-        user = db.get_user(user_id)
-        report = (f"👤 Reader name: {user[1]}\n"
-                  f"📚 Book name: {book_name}\n"
-                  f"💣 From Page: {start_page}\n"
-                  f"💣 To Page: {last_page}\n"
-                  f"💣 Overall: {last_page - start_page}\n"
-                  f"📅 {datetime.now().strftime('%d.%m.%Y')}\n"
-                  f"Finished: {'✅ Yes' if finished else '❌ No'}\n"
-                  f"📩 @shuhrat9111\n"
-                  f"#challange")
-        await bot.send_message(GROUP_CHAT_ID, report)
+        outbox.send(data.get("club_id"), data.get("report"))
         if finished:
             message += "Good luck dude, keep it up! 💪"
         
         # Update database only if sent to group
-        books = db.get_user_books(user_id)
-        book = next((b for b in books if b[1] == book_name), None)
+        book = await db.get_book(user_id, book_name)
         if book:
-            db.update_book_progress(user_id, book_name, last_page, finished)
+            await db.update_book_progress(user_id, book_name, last_page, finished)
         else:
-            db.add_book(user_id, book_name, start_page, last_page, finished)
+            await db.add_book(user_id, book_name, start_page, last_page, finished)
     
     await callback.message.delete()
-    await callback.message.answer(message, reply_markup=get_main_keyboard())
+    await callback.message.answer(message, reply_markup=MAIN_KEYBOARD)
     await state.clear()
 
-@dp.message(lambda message: message.text == "Overall result 📊")
-async def overall_result(message: types.Message):
-    user_id = message.from_user.id
-    if not db.is_admin(user_id):
+# Report buttons pressed twice, or after the report state was cleared or expired.
+@dp.callback_query(lambda c: c.data in ["book_finished", "book_not_finished", "send_to_group", "dont_send"])
+async def stale_report_button(callback: types.CallbackQuery):
+    await callback.answer(STALE_REPORT)
+
+@menu_item("Overall result 📊")
+async def overall_result(message: types.Message, state: FSMContext):
+    user = await db.get_user(message.from_user.id)
+    if not user or not user[4]:
         await message.answer("You don't have permission to view this.")
         return
-    
-    users = db.get_all_users()
-    messages = []
-    current_message = "Overall result 📊s:\n\n"
-    
-    for user in users:
-        books = db.get_user_books(user[0])
-        user_info = f"User: {user[1]} (@{user[2]})\n"
-        if books:
-            user_info += "Books:\n"
-            for book in books:
-                status = "Finished" if book[4] else "In Progress"
-                user_info += f"- {book[1]}: {book[2]}-{book[3]} ({status})\n"
-        else:
-            user_info += "No books recorded.\n"
-        user_info += "\n"
-        
-        if len(current_message + user_info) > 4000:  # Telegram message limit
-            messages.append(current_message)
-            current_message = user_info
-        else:
-            current_message += user_info
-    
-    if current_message:
-        messages.append(current_message)
-    
-    for msg in messages:
-        await message.answer(msg)
+    club_id = await pick_club(message, user, "overall")
+    if club_id is not None:
+        await send_overall(message, club_id)
+
+async def send_overall(message: types.Message, club_id):
+    # Pages are sent as they are built; concurrent and repeated requests for
+    # one club share a single run of the report.
+    pages = overall_reports.stream(club_id, lambda: overall_pages(club_id))
+    async with aclosing(pages):
+        async for page in pages:
+            await message.answer(page)
+
+def overall_pages(club_id):
+    return paginate(overall_blocks(db.iter_users_with_books(club_id)), header="Overall result 📊s:\n\n")
+
+# Admin views cover every club. With more than one club the admin picks which
+# one first; the choice travels in the callback data, not in the FSM.
+class ClubPicker(CallbackData, prefix="club"):
+    view: str  # "overall" or "delete"
+    club_id: int
+
+def get_club_picker(clubs, view):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=club[1] or f"Club {club[0]}", callback_data=ClubPicker(view=view, club_id=club[0]).pack())]
+        for club in clubs
+    ])
+
+async def pick_club(message: types.Message, admin, view):
+    # Returns the club to show right away, or None once the picker is sent.
+    clubs = await db.get_clubs()
+    if len(clubs) <= 1:
+        return admin[5]
+    await message.answer("Which club?", reply_markup=get_club_picker(clubs, view))
+    return None
+
+@dp.callback_query(ClubPicker.filter())
+async def process_club_picker(callback: types.CallbackQuery, callback_data: ClubPicker, state: FSMContext):
+    admin = await db.get_user(callback.from_user.id)
+    if not admin or not admin[4]:
+        await callback.answer("You don't have permission to do this.")
+        return
+    await callback.message.delete()
+    await callback.answer()
+    if callback_data.view == "overall":
+        await send_overall(callback.message, callback_data.club_id)
+    else:
+        await open_user_picker(callback.message, state, callback_data.club_id)
+
+class UserPicker(CallbackData, prefix="pick"):
+    action: str  # "delete", "next", "prev" or "cancel"
+    user_id: int = 0
+
+USERS_PER_PAGE = 8
 
-@dp.message(lambda message: message.text == "Delete users 🗑")
+def get_user_picker(users, has_prev, has_next):
+    rows = [
+        [InlineKeyboardButton(text=f"{user[1]} (@{user[2]})", callback_data=UserPicker(action="delete", user_id=user[0]).pack())]
+        for user in users
+    ]
+    navigation = []
+    if has_prev and users:
+        navigation.append(InlineKeyboardButton(text="« Prev", callback_data=UserPicker(action="prev", user_id=users[0][0]).pack()))
+    if has_next and users:
+        navigation.append(InlineKeyboardButton(text="Next »", callback_data=UserPicker(action="next", user_id=users[-1][0]).pack()))
+    if navigation:
+        rows.append(navigation)
+    rows.append([InlineKeyboardButton(text="Cancel", callback_data=UserPicker(action="cancel").pack())])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+@menu_item("Delete users 🗑")
 async def delete_users(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
-    if not db.is_admin(user_id):
+    admin = await db.get_user(message.from_user.id)
+    if not admin or not admin[4]:
         await message.answer("You don't have permission to do this.")
         return
-    
-    users = db.get_all_users()
-    keyboard = ReplyKeyboardMarkup(
-        keyboard=[
-            [KeyboardButton(text=f"{user[1]} (@{user[2]})")] for user in users
-        ] + [[KeyboardButton(text="Cancel")]],  # Add a "Cancel" button as a separate row
-        resize_keyboard=True
-    )
-    await message.answer("Select a user to delete:", reply_markup=keyboard)
+    club_id = await pick_club(message, admin, "delete")
+    if club_id is not None:
+        await open_user_picker(message, state, club_id)
+
+async def open_user_picker(message: types.Message, state: FSMContext, club_id):
+    users, more = await db.get_users_page(club_id, limit=USERS_PER_PAGE)
+    await message.answer("Select a user to delete, or type a name to search:", reply_markup=get_user_picker(users, False, more))
     await state.set_state(UserStates.waiting_for_admin_delete)
+    await state.update_data(user_prefix=None, club_id=club_id)
 
 @dp.message(UserStates.waiting_for_admin_delete)
 async def process_delete_user(message: types.Message, state: FSMContext):
     if message.text == "Cancel":
-        await message.answer("Cancelled.", reply_markup=get_admin_keyboard())
+        await message.answer("Cancelled.", reply_markup=ADMIN_KEYBOARD)
         await state.clear()
         return
     
-    users = db.get_all_users()
-    selected_user = next((u for u in users if f"{u[1]} (@{u[2]})" == message.text), None)
-    if selected_user:
-        db.delete_user(selected_user[0])
-        await message.answer(f"User {selected_user[1]} deleted.", reply_markup=get_admin_keyboard())
+    prefix = message.text or None
+    admin = await db.get_user(message.from_user.id)
+    club_id = (await state.get_data()).get("club_id", admin[5])
+    users, more = await db.get_users_page(club_id, limit=USERS_PER_PAGE, prefix=prefix)
+    await state.update_data(user_prefix=prefix)
+    if users:
+        await message.answer(f"Users matching '{prefix}':", reply_markup=get_user_picker(users, False, more))
     else:
-        await message.answer("Invalid selection.", reply_markup=get_admin_keyboard())
+        await message.answer(f"No users matching '{prefix}'. Type another name or press Cancel.",
+                             reply_markup=get_user_picker(users, False, False))
+
+@dp.callback_query(UserPicker.filter())
+async def process_user_picker(callback: types.CallbackQuery, callback_data: UserPicker, state: FSMContext):
+    admin = await db.get_user(callback.from_user.id)
+    if not admin or not admin[4]:
+        await callback.answer("You don't have permission to do this.")
+        return
+    
+    if callback_data.action in ("next", "prev"):
+        data = await state.get_data()
+        prefix, club_id = data.get("user_prefix"), data.get("club_id", admin[5])
+        if callback_data.action == "next":
+            users, more = await db.get_users_page(club_id, after_id=callback_data.user_id, limit=USERS_PER_PAGE, prefix=prefix)
+            keyboard = get_user_picker(users, True, more)
+        else:
+            users, more = await db.get_users_page(club_id, before_id=callback_data.user_id, limit=USERS_PER_PAGE, prefix=prefix)
+            keyboard = get_user_picker(users, more, True)
+        await callback.message.edit_reply_markup(reply_markup=keyboard)
+        await callback.answer()
+        return
+    
+    await callback.message.delete()
+    if callback_data.action == "delete":
+        selected_user = await db.get_user(callback_data.user_id)
+        if selected_user:
+            await db.delete_user(selected_user[0])
+            overall_reports.invalidate(selected_user[5])
+            await callback.message.answer(f"User {selected_user[1]} deleted.", reply_markup=ADMIN_KEYBOARD)
+        else:
+            await callback.message.answer("Invalid selection.", reply_markup=ADMIN_KEYBOARD)
+    else:
+        await callback.message.answer("Cancelled.", reply_markup=ADMIN_KEYBOARD)
+    await callback.answer()
     await state.clear()
 
 
-@dp.message(lambda message: message.text)
-async def select_book(message: types.Message, state: FSMContext):
-    if message.text in [book[1] for book in db.get_user_books(message.from_user.id)]:
-        user_id = message.from_user.id
-        book_name = message.text
-        books = db.get_user_books(user_id)
-        book = next((b for b in books if b[1] == book_name), None)
-        if book and book[4]:
-            await message.answer(f"You have already finished reading '{book_name}'. Please select another book or add a new one.", reply_markup=await get_books_keyboard(user_id))
-            await state.clear()
-            return
-        if book:
-            await message.answer(f"You selected the book: {book_name}\nEnter the last page you read (minimum 10 pages more than {book[3]}):")
+@dp.message(lambda message: message.text, user_book)
+async def select_book(message: types.Message, state: FSMContext, book: tuple):
+    user_id = message.from_user.id
+    book_name = message.text
+    if book[4]:
+        await message.answer(f"You have already finished reading '{book_name}'. Please select another book or add a new one.", reply_markup=await get_books_keyboard(user_id))
+        await state.clear()
+        return
+    await message.answer(f"You selected the book: {book_name}\nEnter the last page you read (minimum 10 pages more than {book[3]}):")
+    await state.update_data(book_name=book_name)
+    await state.set_state(UserStates.waiting_for_last_page)
+
+# Scheduled tasks. Every club gets its own pair of jobs; jitter spreads them
+# over REPORT_JITTER seconds after the cron time and report_slots caps how
+# many clubs query and render at once.
+@timed_job
+async def daily_report(club_id):
+    async with report_slots:
+        rows = await db.get_daily_summary(club_id)
+        async for page in paginate(daily_blocks(rows), header="Daily Reading Report:\n\n"):
+            outbox.send(club_id, page)
+
+@timed_job
+async def weekly_report(club_id):
+    async with report_slots:
+        readers = [row for row in await db.get_weekly_summary(club_id, limit=5) if row[3]]
+        if readers:
+            report = f"Congratulations to @{readers[0][2]} for reading the most pages this week!\n\n"
+            for user_id, name, username, pages_read, rank in readers:
+                report += f"{rank}. {name} (@{username}) - {pages_read} pages\n"
+            outbox.send(club_id, report)
         else:
-            await message.answer("Enter the last page you read (minimum 10 pages):")
-        await state.update_data(book_name=book_name)
-        await state.set_state(UserStates.waiting_for_last_page)
-# Scheduled tasks
-async def daily_report():
-    users = db.get_all_users()
-    report = "Daily Reading Report:\n\n"
-    for user in users:
-        if not db.is_user_active(user[0]):
-            continue
-        pages_read = db.get_daily_reading(user[0])
-        report += f"{user[1]} (@{user[2]}) - {'Read ' + str(pages_read) + ' pages' if pages_read else 'Did not read'}\n"
-    await bot.send_message(GROUP_CHAT_ID, report)
-    db.clear_daily()
-
-async def weekly_report():
-    top_reader = db.get_top_reader()
-    if top_reader:
-        await bot.send_message(GROUP_CHAT_ID, f"Congratulations to @{top_reader[2]} for reading the most pages this week!")
-    else:
-        await bot.send_message(GROUP_CHAT_ID, "No reading activity this week.")
-    db.clear_weekly()
+            outbox.send(club_id, "No reading activity this week.")
 
-async def main():
-    # Initialize scheduler
-    scheduler = AsyncIOScheduler()
-    scheduler.add_job(daily_report, 'cron', hour=19, minute=0)
-    scheduler.add_job(weekly_report, 'cron', day_of_week='sat', hour=4, minute=0)
+def schedule_club_reports(club_id):
+    scheduler.add_job(daily_report, 'cron', args=[club_id], hour=19, minute=0, jitter=REPORT_JITTER,
+                      id=f'daily_report:{club_id}', replace_existing=True)
+    scheduler.add_job(weekly_report, 'cron', args=[club_id], day_of_week='sat', hour=4, minute=0, jitter=REPORT_JITTER,
+                      id=f'weekly_report:{club_id}', replace_existing=True)
+
+async def on_startup(bot: Bot):
+    bot.session.middleware(RequestMetricsMiddleware())
+    await db.connect()
+    storage.start()
+    # /metrics is only served on the local metrics port, never on the public
+    # webhook app.
+    dp["metrics_runner"] = await start_metrics_server(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+
+    for club in await db.get_clubs():
+        schedule_club_reports(club[0])
     scheduler.start()
-    
+
+    if USE_WEBHOOK and WEBHOOK_URL:
+        await bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET or None)
+
+async def on_shutdown():
+    scheduler.shutdown(wait=False)
+    if dp.get("metrics_runner") is not None:
+        await dp["metrics_runner"].cleanup()
+    charts.close()
+    await outbox.close()
+    await db.close()
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+async def health(request: web.Request):
+    return web.json_response({"status": "ok", "outbox": outbox.stats()})
+
+def create_app():
+    app = web.Application()
+    app.router.add_get('/health', health)
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET or None).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def main():
     # Start polling
-    await dp.start_polling(bot)
+    await bot.delete_webhook()
+    await dp.start_polling(bot, handle_as_tasks=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if USE_WEBHOOK:
+        web.run_app(create_app(), host=WEBAPP_HOST, port=WEBAPP_PORT)
+    else:
+        asyncio.run(main())
@@ -0,0 +1,242 @@
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        self.series = {}
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in self.series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _labels(self.label_names + ('le',), labels + (bound,))
+                yield f"{self.name}_bucket{le} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + ('+Inf',))} {count}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {count}"
+
+
+# A value read from elsewhere at scrape time. Pass kind='counter' (and a
+# _total name) when the value only ever grows, such as a running total kept
+# by another object.
+class Gauge:
+    def __init__(self, name, help, collect, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self.kind = kind
+        REGISTRY.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        yield f"{self.name} {self.collect()}"
+
+
+REGISTRY = []
+
+HANDLER_LATENCY = Histogram('bookclub_handler_seconds', "Update handler latency", ('handler',))
+HANDLER_ERRORS = Counter('bookclub_handler_errors_total', "Update handlers that raised", ('handler',))
+QUERY_LATENCY = Histogram('bookclub_db_seconds', "Database method latency", ('method',))
+QUERY_ERRORS = Counter('bookclub_db_errors_total', "Database methods that raised", ('method',))
+TELEGRAM_LATENCY = Histogram('bookclub_telegram_seconds', "Telegram Bot API request latency", ('method',))
+TELEGRAM_ERRORS = Counter('bookclub_telegram_errors_total', "Telegram Bot API requests that failed", ('method',))
+JOB_LATENCY = Histogram('bookclub_job_seconds', "Scheduled job duration", ('job',),
+                        buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300))
+JOB_ERRORS = Counter('bookclub_job_errors_total', "Scheduled jobs that raised", ('job',))
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware(BaseMiddleware):
+    # A handler can expose resolve_name(event) to report a more specific name,
+    # e.g. the menu dispatcher reporting which menu item it ran.
+    async def __call__(self, handler, event, data):
+        callback = data['handler'].callback
+        resolve_name = getattr(callback, 'resolve_name', None)
+        name = resolve_name(event) if resolve_name else callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+
+class RequestMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            TELEGRAM_ERRORS.inc(name)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - started, name)
+
+
+def timed_job(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            JOB_ERRORS.inc(func.__name__)
+            raise
+        finally:
+            JOB_LATENCY.observe(time.perf_counter() - started, func.__name__)
+    return wrapper
+
+
+# Set while an instrumented database method runs.
+_in_query = contextvars.ContextVar('in_query', default=False)
+
+
+def _record_query(name, elapsed, slow_query_ms):
+    QUERY_LATENCY.observe(elapsed, name)
+    if slow_query_ms is not None and elapsed * 1000 >= slow_query_ms:
+        logger.warning("Slow database call %s took %.1f ms", name, elapsed * 1000)
+
+
+def _timed_method(name, method, slow_query_ms):
+    if inspect.isasyncgenfunction(method):
+        # Only the time spent producing rows counts; the caller may do slow
+        # work (e.g. sending messages) between items.
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            if _in_query.get():
+                async for item in method(*args, **kwargs):
+                    yield item
+                return
+            rows = method(*args, **kwargs)
+            elapsed = 0.0
+            try:
+                while True:
+                    started = time.perf_counter()
+                    token = _in_query.set(True)
+                    try:
+                        item = await rows.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    finally:
+                        _in_query.reset(token)
+                        elapsed += time.perf_counter() - started
+                    yield item
+            except Exception:
+                QUERY_ERRORS.inc(name)
+                raise
+            finally:
+                await rows.aclose()
+                _record_query(name, elapsed, slow_query_ms)
+        return wrapper
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        if _in_query.get():
+            return await method(*args, **kwargs)
+        started = time.perf_counter()
+        token = _in_query.set(True)
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            QUERY_ERRORS.inc(name)
+            raise
+        finally:
+            _in_query.reset(token)
+            _record_query(name, time.perf_counter() - started, slow_query_ms)
+    return wrapper
+
+
+def instrument_database(db, slow_query_ms=None, exclude=('connect', 'close', 'fetchone', 'fetchall')):
+    # Shadows every public coroutine method on the instance with a timed one.
+    # Calls made from inside another instrumented method (is_user_active ->
+    # get_user) are not recorded again, so each call from outside the database
+    # layer is counted once, under the name it was made with.
+    for name, method in inspect.getmembers(db, inspect.ismethod):
+        if name.startswith('_') or name in exclude:
+            continue
+        if inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method):
+            setattr(db, name, _timed_method(name, method, slow_query_ms))
+    return db
+
+
+async def metrics_view(request):
+    return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def start_metrics_server(host, port):
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,181 @@
+from config import DEFAULT_CLUB_ID
+
+# Versioned schema. MIGRATIONS[n - 1] upgrades a database from version n - 1
+# to n, and PRAGMA user_version records the last version applied. Append new
+# steps to the end; never edit one that has shipped. Statements may use the
+# named parameters in MIGRATION_PARAMS.
+MIGRATIONS = [
+    # 1: baseline tables (IF NOT EXISTS, so pre-migration databases adopt it as is)
+    [
+        '''CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            username TEXT,
+            is_active INTEGER DEFAULT 1,
+            is_admin INTEGER DEFAULT 0
+        )''',
+        '''CREATE TABLE IF NOT EXISTS books (
+            user_id INTEGER,
+            book_name TEXT,
+            start_page INTEGER,
+            last_page INTEGER,
+            finished INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, book_name),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS daily_reading (
+            user_id INTEGER,
+            date TEXT,
+            pages_read INTEGER,
+            PRIMARY KEY (user_id, date),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS weekly_reading (
+            user_id INTEGER,
+            week TEXT,
+            pages_read INTEGER,
+            PRIMARY KEY (user_id, week),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS reading_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            book_name TEXT NOT NULL,
+            from_page INTEGER NOT NULL,
+            to_page INTEGER NOT NULL,
+            pages INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS reading_totals (
+            user_id INTEGER PRIMARY KEY,
+            pages_read INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            last_read_at TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )''',
+    ],
+    # 2: secondary indexes for the report, history and FSM expiry queries
+    [
+        'CREATE INDEX IF NOT EXISTS idx_users_active ON users (is_active)',
+        'CREATE INDEX IF NOT EXISTS idx_daily_reading_date ON daily_reading (date, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_weekly_reading_week ON weekly_reading (week, pages_read DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_reading_sessions_user ON reading_sessions (user_id, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)',
+    ],
+    # 3: case-insensitive name prefix search for the admin user picker
+    [
+        'CREATE INDEX IF NOT EXISTS idx_users_name ON users (name COLLATE NOCASE)',
+    ],
+    # 4: clubs; every member and stats row belongs to one, existing data to the default club
+    [
+        '''CREATE TABLE IF NOT EXISTS clubs (
+            club_id INTEGER PRIMARY KEY,
+            title TEXT,
+            is_active INTEGER NOT NULL DEFAULT 1
+        )''',
+        'INSERT OR IGNORE INTO clubs (club_id) VALUES (:default_club)',
+        'ALTER TABLE users ADD COLUMN club_id INTEGER REFERENCES clubs(club_id)',
+        'ALTER TABLE books ADD COLUMN club_id INTEGER REFERENCES clubs(club_id)',
+        'ALTER TABLE daily_reading ADD COLUMN club_id INTEGER REFERENCES clubs(club_id)',
+        'ALTER TABLE weekly_reading ADD COLUMN club_id INTEGER REFERENCES clubs(club_id)',
+        'ALTER TABLE reading_sessions ADD COLUMN club_id INTEGER REFERENCES clubs(club_id)',
+        'UPDATE users SET club_id = :default_club',
+        'UPDATE books SET club_id = :default_club',
+        'UPDATE daily_reading SET club_id = :default_club',
+        'UPDATE weekly_reading SET club_id = :default_club',
+        'UPDATE reading_sessions SET club_id = :default_club',
+        'CREATE INDEX IF NOT EXISTS idx_users_club ON users (club_id, is_active)',
+        'CREATE INDEX IF NOT EXISTS idx_users_club_name ON users (club_id, name COLLATE NOCASE)',
+        'CREATE INDEX IF NOT EXISTS idx_books_club ON books (club_id, user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_daily_reading_club ON daily_reading (club_id, date)',
+        'CREATE INDEX IF NOT EXISTS idx_weekly_reading_club ON weekly_reading (club_id, week, pages_read DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_reading_sessions_club ON reading_sessions (club_id, created_at)',
+    ],
+    # 5: rollups keyed by club too, so a member who moves starts fresh rows in the
+    # new club; SQLite cannot change a primary key, so the tables are rebuilt
+    [
+        '''CREATE TABLE daily_reading_new (
+            user_id INTEGER,
+            date TEXT,
+            pages_read INTEGER,
+            club_id INTEGER REFERENCES clubs(club_id),
+            PRIMARY KEY (user_id, club_id, date),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''INSERT INTO daily_reading_new (user_id, date, pages_read, club_id)
+           SELECT user_id, date, pages_read, COALESCE(club_id, :default_club) FROM daily_reading''',
+        'DROP TABLE daily_reading',
+        'ALTER TABLE daily_reading_new RENAME TO daily_reading',
+        'CREATE INDEX idx_daily_reading_date ON daily_reading (date, user_id)',
+        'CREATE INDEX idx_daily_reading_club ON daily_reading (club_id, date)',
+        '''CREATE TABLE weekly_reading_new (
+            user_id INTEGER,
+            week TEXT,
+            pages_read INTEGER,
+            club_id INTEGER REFERENCES clubs(club_id),
+            PRIMARY KEY (user_id, club_id, week),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''INSERT INTO weekly_reading_new (user_id, week, pages_read, club_id)
+           SELECT user_id, week, pages_read, COALESCE(club_id, :default_club) FROM weekly_reading''',
+        'DROP TABLE weekly_reading',
+        'ALTER TABLE weekly_reading_new RENAME TO weekly_reading',
+        'CREATE INDEX idx_weekly_reading_week ON weekly_reading (week, pages_read DESC)',
+        'CREATE INDEX idx_weekly_reading_club ON weekly_reading (club_id, week, pages_read DESC)',
+        # totals have always been a rollup of reading_sessions, which already
+        # carry their club, so they are rebuilt from there
+        '''CREATE TABLE reading_totals_new (
+            user_id INTEGER,
+            club_id INTEGER REFERENCES clubs(club_id),
+            pages_read INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            last_read_at TEXT,
+            PRIMARY KEY (user_id, club_id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )''',
+        '''INSERT INTO reading_totals_new (user_id, club_id, pages_read, sessions, last_read_at)
+           SELECT user_id, COALESCE(club_id, :default_club), SUM(pages), COUNT(*), MAX(created_at)
+           FROM reading_sessions GROUP BY 1, 2''',
+        'DROP TABLE reading_totals',
+        'ALTER TABLE reading_totals_new RENAME TO reading_totals',
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+MIGRATION_PARAMS = {'default_club': DEFAULT_CLUB_ID}
+
+
+def migrate(conn):
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        conn.execute('BEGIN')
+        try:
+            for statement in MIGRATIONS[number - 1]:
+                conn.execute(statement, MIGRATION_PARAMS)
+            conn.execute(f'PRAGMA user_version = {number}')
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+async def migrate_async(conn):
+    async with conn.execute('PRAGMA user_version') as cursor:
+        version = (await cursor.fetchone())[0]
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        await conn.execute('BEGIN')
+        try:
+            for statement in MIGRATIONS[number - 1]:
+                await conn.execute(statement, MIGRATION_PARAMS)
+            await conn.execute(f'PRAGMA user_version = {number}')
+        except BaseException:
+            await conn.rollback()
+            raise
+        await conn.commit()
@@ -0,0 +1,81 @@
+from datetime import datetime
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from cache import LRUCache
+
+# Static keyboards are built once and shared by every message that uses them.
+# aiogram markups are plain pydantic models, so treat these as read-only:
+# copy one with model_copy() before changing it.
+MAIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Today have read 📚"), KeyboardButton(text="Log out 🚪")]
+    ],
+    resize_keyboard=True
+)
+
+ADMIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Today have read 📚"), KeyboardButton(text="Log out 🚪")],
+        [KeyboardButton(text="Overall result 📊"), KeyboardButton(text="Delete users 🗑")]
+    ],
+    resize_keyboard=True
+)
+
+JOIN_AGAIN_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Join again 💠")]
+    ],
+    resize_keyboard=True
+)
+
+LOGGED_OUT_KEYBOARD = ReplyKeyboardMarkup(
+    keyboard=[
+        [KeyboardButton(text="Join again")]
+    ],
+    resize_keyboard=True
+)
+
+BOOK_STATUS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Finished", callback_data="book_finished"),
+     InlineKeyboardButton(text="Not finished", callback_data="book_not_finished")]
+])
+
+SEND_REPORT_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="Yes", callback_data="send_to_group"),
+     InlineKeyboardButton(text="No", callback_data="dont_send")]
+])
+
+ADD_BOOK_BUTTON = [KeyboardButton(text="+ add new one  📕")]
+
+# Book keyboards per user_id, stored with the BookIndex they were built from.
+# AsyncDatabase replaces a user's BookIndex whenever their books change, so an
+# identity check is enough to tell whether the keyboard is still current.
+_book_keyboards = LRUCache(4096)
+
+
+def books_keyboard(user_id, books):
+    cached = _book_keyboards.get(user_id, None)
+    if cached is not None and cached[0] is books:
+        return cached[1]
+    keyboard = ReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=book_name)] for book_name in books.unfinished] + [ADD_BOOK_BUTTON],
+        resize_keyboard=True
+    )
+    _book_keyboards.set(user_id, (books, keyboard))
+    return keyboard
+
+
+REPORT_TEMPLATE = ("👤 Reader name: {name}\n"
+                   "📚 Book name: {book_name}\n"
+                   "💣 From Page: {start_page}\n"
+                   "💣 To Page: {last_page}\n"
+                   "💣 Overall: {pages}\n"
+                   "📅 {date:%d.%m.%Y}\n"
+                   "Finished: {finished}\n"
+                   "📩 @shuhrat9111\n"
+                   "#challange")
+
+
+def reading_report(name, book_name, start_page, last_page, finished, date=None):
+    return REPORT_TEMPLATE.format(name=name, book_name=book_name, start_page=start_page, last_page=last_page,
+                                  pages=last_page - start_page, date=date or datetime.now(),
+                                  finished='✅ Yes' if finished else '❌ No')
@@ -0,0 +1,61 @@
+MESSAGE_LIMIT = 4000  # Telegram message limit
+
+
+async def overall_blocks(rows):
+    # rows come from AsyncDatabase.iter_users_with_books, ordered by user_id.
+    current_user = None
+    lines = []
+    async for user_id, name, username, book_name, start_page, last_page, finished in rows:
+        if user_id != current_user:
+            if lines:
+                yield "".join(lines) + "\n"
+            current_user = user_id
+            lines = [f"User: {name} (@{username})\n"]
+            lines.append("Books:\n" if book_name is not None else "No books recorded.\n")
+        if book_name is not None:
+            status = "Finished" if finished else "In Progress"
+            lines.append(f"- {book_name}: {start_page}-{last_page} ({status})\n")
+    if lines:
+        yield "".join(lines) + "\n"
+
+
+async def daily_blocks(rows):
+    # rows come from AsyncDatabase.get_daily_summary, one line per member.
+    for user_id, name, username, pages_read in rows:
+        yield f"{name} (@{username}) - {'Read ' + str(pages_read) + ' pages' if pages_read else 'Did not read'}\n"
+
+
+def _split(block, limit):
+    # A block longer than a page is cut at line ends, and a single line longer
+    # than a page at the limit itself.
+    if len(block) <= limit:
+        yield block
+        return
+    chunk = ""
+    for line in block.splitlines(keepends=True):
+        while len(line) > limit:
+            if chunk:
+                yield chunk
+                chunk = ""
+            yield line[:limit]
+            line = line[limit:]
+        if len(chunk) + len(line) > limit:
+            yield chunk
+            chunk = ""
+        chunk += line
+    if chunk:
+        yield chunk
+
+
+async def paginate(blocks, header="", limit=MESSAGE_LIMIT):
+    page = [header] if header else []
+    size = len(header)
+    async for block in blocks:
+        for part in _split(block, limit):
+            if page and size + len(part) > limit:
+                yield "".join(page)
+                page, size = [], 0
+            page.append(part)
+            size += len(part)
+    if page:
+        yield "".join(page)
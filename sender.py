@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_TEXT_LIMIT = 4096
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, tokens=1):
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens=1):
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    async def acquire(self, tokens=1):
+        while not self.consume(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+
+# Background outbox for group messages. Handlers call send() and return at
+# once; one worker per chat drains its queue under a per-chat token bucket
+# (Telegram allows about 20 messages a minute into a group) plus a global one,
+# merging queued texts with the same options into a single message.
+class MessageQueue:
+    def __init__(self, bot, chat_rate=20 / 60, chat_burst=5, global_rate=30, max_retries=5):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.max_retries = max_retries
+        self.queues = {}
+        self.buckets = {}
+        self.workers = {}
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def send(self, chat_id, text, **kwargs):
+        self.queues.setdefault(chat_id, deque()).append((text, kwargs, time.monotonic()))
+        if chat_id not in self.workers:
+            self.workers[chat_id] = asyncio.create_task(self._drain(chat_id))
+
+    def depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def stats(self):
+        return {
+            'depth': self.depth(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'coalesced': self.coalesced,
+            'latency_avg': self.latency_total / self.sent if self.sent else 0.0,
+            'latency_max': self.latency_max,
+        }
+
+    async def close(self, timeout=10):
+        workers = list(self.workers.values())
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning("Dropped %d queued messages on shutdown", self.depth())
+
+    async def _drain(self, chat_id):
+        queue = self.queues[chat_id]
+        bucket = self.buckets.setdefault(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+        try:
+            while queue:
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                text, kwargs, enqueued = self._take(queue)
+                if await self._deliver(chat_id, text, kwargs):
+                    latency = time.monotonic() - enqueued
+                    self.sent += 1
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                else:
+                    self.failed += 1
+        finally:
+            # No await between the emptiness check and this pop, so send()
+            # either sees this worker still registered or starts a new one.
+            self.workers.pop(chat_id, None)
+            if not queue:
+                self.queues.pop(chat_id, None)
+
+    def _take(self, queue):
+        text, kwargs, enqueued = queue.popleft()
+        while (queue and queue[0][1] == kwargs and isinstance(text, str) and isinstance(queue[0][0], str)
+               and len(text) + 2 + len(queue[0][0]) <= TELEGRAM_TEXT_LIMIT):
+            text += "\n\n" + queue.popleft()[0]
+            self.coalesced += 1
+        return text, kwargs, enqueued
+
+    async def _deliver(self, chat_id, text, kwargs):
+        for attempt in range(self.max_retries):
+            try:
+                await self.bot.send_message(chat_id, text, **kwargs)
+                return True
+            except TelegramRetryAfter as e:
+                self.retried += 1
+                logger.warning("Flood limit for chat %s, retrying in %ss", chat_id, e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramAPIError:
+                logger.exception("Failed to send message to chat %s", chat_id)
+                return False
+            except Exception:
+                # A malformed item (e.g. text=None) must not kill the chat's worker.
+                logger.exception("Could not send message to chat %s", chat_id)
+                return False
+        logger.error("Giving up on message to chat %s after %d retries", chat_id, self.max_retries)
+        return False
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ('state', 'data', 'touched')
+
+    def __init__(self, state=None, data=None, touched=None):
+        self.state = state
+        self.data = data or {}
+        self.touched = touched or time.time()
+
+
+# FSM storage persisted to the fsm_states table of the bot's database.
+# Reads and writes hit an in-memory LRU of entries; changed keys are written
+# back in one batched transaction every flush_interval seconds and on close().
+# States untouched for ttl seconds are treated as abandoned and dropped.
+class SQLiteStorage(BaseStorage):
+    def __init__(self, db, ttl=24 * 60 * 60, max_entries=10000, flush_interval=5):
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.entries = OrderedDict()
+        self.dirty = set()
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.expire()
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush FSM storage")
+
+    @staticmethod
+    def _key(key):
+        return (f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:"
+                f"{key.business_connection_id or ''}:{key.destiny}")
+
+    async def _entry(self, key):
+        k = self._key(key)
+        entry = self.entries.get(k)
+        if entry is not None:
+            self.entries.move_to_end(k)
+            return k, entry
+        row = await self.db.fetchone('SELECT state, data, updated_at FROM fsm_states WHERE key = ?', (k,))
+        # Another coroutine may have loaded the same key while we were waiting.
+        entry = self.entries.get(k)
+        if entry is None:
+            if row is not None and row[2] >= time.time() - self.ttl:
+                entry = _Entry(row[0], json.loads(row[1]), row[2])
+            else:
+                entry = _Entry()
+            self._shrink(self.max_entries - 1)
+            self.entries[k] = entry
+        return k, entry
+
+    def _touch(self, k, entry):
+        entry.touched = time.time()
+        self.dirty.add(k)
+
+    def _shrink(self, limit=None):
+        # Only clean entries can be dropped; dirty ones leave on the next flush.
+        limit = self.max_entries if limit is None else limit
+        for k in list(self.entries):
+            if len(self.entries) <= limit:
+                break
+            if k not in self.dirty:
+                del self.entries[k]
+
+    async def set_state(self, key, state=None):
+        k, entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        self._touch(k, entry)
+
+    async def get_state(self, key):
+        k, entry = await self._entry(key)
+        return entry.state
+
+    async def set_data(self, key, data):
+        k, entry = await self._entry(key)
+        entry.data = dict(data)
+        self._touch(k, entry)
+
+    async def get_data(self, key):
+        k, entry = await self._entry(key)
+        return dict(entry.data)
+
+    def expire(self):
+        deadline = time.time() - self.ttl
+        for k, entry in list(self.entries.items()):
+            if entry.touched < deadline:
+                entry.state, entry.data = None, {}
+                self.dirty.add(k)
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+        upserts, deletes = [], []
+        for k in dirty:
+            entry = self.entries.get(k)
+            if entry is None or (entry.state is None and not entry.data):
+                deletes.append((k,))
+            else:
+                upserts.append((k, entry.state, json.dumps(entry.data), entry.touched))
+        try:
+            async with self.db.transaction() as conn:
+                await conn.executemany('''INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                                          ON CONFLICT (key) DO UPDATE SET state = excluded.state, data = excluded.data,
+                                                                          updated_at = excluded.updated_at''', upserts)
+                await conn.executemany('DELETE FROM fsm_states WHERE key = ?', deletes)
+                await conn.execute('DELETE FROM fsm_states WHERE updated_at < ?', (time.time() - self.ttl,))
+        except BaseException:
+            # Includes cancellation by close(): the keys go back so the final
+            # flush writes them.
+            self.dirty |= dirty
+            raise
+        for (k,) in deletes:
+            entry = self.entries.get(k)
+            if entry is not None and k not in self.dirty and entry.state is None and not entry.data:
+                del self.entries[k]
+        self._shrink()
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        await self.flush()
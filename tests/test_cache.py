@@ -0,0 +1,117 @@
+import asyncio
+from contextlib import aclosing
+from cache import SharedStream
+
+
+class Source:
+    # Counts runs; each item waits on `gate` so tests can hold a run open.
+    def __init__(self, items, gate=None):
+        self.items = items
+        self.gate = gate
+        self.runs = 0
+
+    async def __call__(self):
+        self.runs += 1
+        for item in self.items:
+            if self.gate is not None:
+                await self.gate.wait()
+            yield item
+
+
+async def collect(shared, key, source):
+    async with aclosing(shared.stream(key, source)) as items:
+        return [item async for item in items]
+
+
+def test_concurrent_callers_share_one_run():
+    async def run():
+        shared = SharedStream(ttl=60)
+        gate = asyncio.Event()
+        source = Source(['a', 'b', 'c'], gate)
+        tasks = [asyncio.create_task(collect(shared, 'club', source)) for _ in range(5)]
+        await asyncio.sleep(0)
+        gate.set()
+        return await asyncio.gather(*tasks), source.runs
+
+    results, runs = asyncio.run(run())
+    assert results == [['a', 'b', 'c']] * 5
+    assert runs == 1
+
+
+def test_finished_stream_is_replayed_until_invalidated():
+    async def run():
+        shared = SharedStream(ttl=60)
+        source = Source(['a', 'b'])
+        first = await collect(shared, 'club', source)
+        second = await collect(shared, 'club', source)
+        shared.invalidate('club')
+        third = await collect(shared, 'club', source)
+        return first, second, third, source.runs
+
+    first, second, third, runs = asyncio.run(run())
+    assert first == second == third == ['a', 'b']
+    assert runs == 2
+
+
+def test_expired_result_runs_the_source_again():
+    async def run():
+        shared = SharedStream(ttl=0)
+        source = Source(['a'])
+        await collect(shared, 'club', source)
+        await collect(shared, 'club', source)
+        return source.runs
+
+    assert asyncio.run(run()) == 2
+
+
+def test_stream_longer_than_max_items_is_not_kept():
+    async def run():
+        shared = SharedStream(ttl=60, max_items=2)
+        source = Source(['a', 'b', 'c'])
+        first = await collect(shared, 'club', source)
+        second = await collect(shared, 'club', source)
+        return first, second, source.runs
+
+    first, second, runs = asyncio.run(run())
+    assert first == second == ['a', 'b', 'c']
+    assert runs == 2
+
+
+def test_abandoned_stream_releases_waiters_and_is_not_cached():
+    async def run():
+        shared = SharedStream(ttl=60)
+        gate = asyncio.Event()
+        source = Source(['a', 'b', 'c'], gate)
+        leader = shared.stream('club', source)
+        gate.set()
+        assert await leader.__anext__() == 'a'
+        gate.clear()
+        waiter = asyncio.create_task(collect(shared, 'club', source))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        await leader.aclose()
+        gate.set()
+        return await asyncio.wait_for(waiter, 1), source.runs, 'club' in shared.running
+
+    items, runs, still_running = asyncio.run(run())
+    assert items == ['a', 'b', 'c']
+    assert runs == 2
+    assert not still_running
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_run():
+    async def run():
+        shared = SharedStream(ttl=60)
+        gate = asyncio.Event()
+        source = Source(['a', 'b'], gate)
+        leader = asyncio.create_task(collect(shared, 'club', source))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(collect(shared, 'club', source))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        gate.set()
+        return await leader, source.runs
+
+    items, runs = asyncio.run(run())
+    assert items == ['a', 'b']
+    assert runs == 1
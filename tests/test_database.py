@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from database import AsyncDatabase
+
+CLUB = -100
+OTHER_CLUB = -200
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = AsyncDatabase(str(tmp_path / 'bot.db'))
+
+    async def setup():
+        await db.connect()
+        await db.add_club(CLUB, 'Club')
+        await db.add_club(OTHER_CLUB, 'Other')
+        for user_id, name in enumerate(['Ann', 'Bob', 'anna', 'Carl', 'Dan', 'An_t', 'Eve'], start=1):
+            await db.add_user(user_id, name, name.lower(), CLUB)
+        await db.add_user(99, 'Annette', 'annette', OTHER_CLUB)
+
+    asyncio.run(setup())
+    yield db
+    asyncio.run(db.close())
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def test_users_page_walks_forward_and_back(db):
+    async def run():
+        first, more_first = await db.get_users_page(CLUB, limit=3)
+        second, more_second = await db.get_users_page(CLUB, after_id=first[-1][0], limit=3)
+        last, more_last = await db.get_users_page(CLUB, after_id=second[-1][0], limit=3)
+        back, more_back = await db.get_users_page(CLUB, before_id=last[0][0], limit=3)
+        return (first, more_first), (second, more_second), (last, more_last), (back, more_back)
+
+    (first, more_first), (second, more_second), (last, more_last), (back, more_back) = asyncio.run(run())
+    assert (ids(first), more_first) == ([1, 2, 3], True)
+    assert (ids(second), more_second) == ([4, 5, 6], True)
+    assert (ids(last), more_last) == ([7], False)
+    assert (ids(back), more_back) == ([4, 5, 6], True)
+
+
+def test_users_page_stays_in_its_club(db):
+    rows, more = asyncio.run(db.get_users_page(OTHER_CLUB, limit=10))
+    assert (ids(rows), more) == ([99], False)
+
+
+def test_users_page_prefix_is_case_insensitive_and_escaped(db):
+    async def run():
+        return (await db.get_users_page(CLUB, prefix='an', limit=10),
+                await db.get_users_page(CLUB, prefix='An_', limit=10),
+                await db.get_users_page(CLUB, prefix='an', after_id=1, limit=1))
+
+    matching, underscore, paged = asyncio.run(run())
+    assert ids(matching[0]) == [1, 3, 6]
+    assert ids(underscore[0]) == [6]
+    assert (ids(paged[0]), paged[1]) == ([3], True)
+
+
+def test_users_with_books_are_streamed_in_batches(db):
+    async def run():
+        await db.add_book(1, 'Dune', 1, 40, 0)
+        await db.add_book(1, 'Emma', 1, 20, 1)
+        await db.add_book(4, 'Ulysses', 1, 15, 0)
+        return [row async for row in db.iter_users_with_books(CLUB, batch_size=2)]
+
+    rows = asyncio.run(run())
+    assert [row[0] for row in rows] == [1, 1, 2, 3, 4, 5, 6, 7]
+    assert sorted(row[3] for row in rows if row[0] == 1) == ['Dune', 'Emma']
+    assert [row[3] for row in rows if row[0] == 2] == [None]
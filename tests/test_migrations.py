@@ -0,0 +1,129 @@
+import asyncio
+import sqlite3
+import aiosqlite
+import pytest
+import migrations
+from config import DEFAULT_CLUB_ID
+from migrations import SCHEMA_VERSION, migrate, migrate_async
+
+# Schema created by Database.create_tables before versioned migrations existed.
+BASELINE = [
+    '''CREATE TABLE users (
+        user_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        username TEXT,
+        is_active INTEGER DEFAULT 1,
+        is_admin INTEGER DEFAULT 0
+    )''',
+    '''CREATE TABLE books (
+        user_id INTEGER,
+        book_name TEXT,
+        start_page INTEGER,
+        last_page INTEGER,
+        finished INTEGER DEFAULT 0,
+        PRIMARY KEY (user_id, book_name),
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )''',
+    '''CREATE TABLE daily_reading (
+        user_id INTEGER,
+        date TEXT,
+        pages_read INTEGER,
+        PRIMARY KEY (user_id, date),
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )''',
+    '''CREATE TABLE weekly_reading (
+        user_id INTEGER,
+        week TEXT,
+        pages_read INTEGER,
+        PRIMARY KEY (user_id, week),
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )''',
+]
+
+
+def baseline_database(path):
+    conn = sqlite3.connect(path)
+    with conn:
+        for statement in BASELINE:
+            conn.execute(statement)
+        conn.execute("INSERT INTO users VALUES (1, 'Ann', 'ann', 1, 0)")
+        conn.execute("INSERT INTO books VALUES (1, 'Dune', 1, 40, 0)")
+        conn.execute("INSERT INTO daily_reading VALUES (1, '2026-10-17', 39)")
+        conn.execute("INSERT INTO weekly_reading VALUES (1, '2026-41', 39)")
+    return conn
+
+
+def schema(conn):
+    return conn.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' ORDER BY name").fetchall()
+
+
+def test_baseline_database_is_upgraded_with_its_data(tmp_path):
+    conn = baseline_database(tmp_path / 'bot.db')
+    migrate(conn)
+
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert conn.execute('SELECT * FROM users').fetchall() == [(1, 'Ann', 'ann', 1, 0, DEFAULT_CLUB_ID)]
+    assert conn.execute('SELECT user_id, book_name, club_id FROM books').fetchall() == [(1, 'Dune', DEFAULT_CLUB_ID)]
+    assert conn.execute('SELECT user_id, date, pages_read, club_id FROM daily_reading').fetchall() == [
+        (1, '2026-10-17', 39, DEFAULT_CLUB_ID)]
+    assert conn.execute('SELECT user_id, week, pages_read, club_id FROM weekly_reading').fetchall() == [
+        (1, '2026-41', 39, DEFAULT_CLUB_ID)]
+    assert conn.execute('SELECT club_id FROM clubs').fetchall() == [(DEFAULT_CLUB_ID,)]
+    names = {row[1] for row in schema(conn)}
+    assert {'reading_sessions', 'reading_totals', 'fsm_states', 'idx_daily_reading_club',
+            'idx_weekly_reading_club', 'idx_users_club_name'} <= names
+
+
+def test_upgraded_database_matches_a_fresh_one(tmp_path):
+    upgraded = baseline_database(tmp_path / 'old.db')
+    migrate(upgraded)
+    fresh = sqlite3.connect(tmp_path / 'new.db')
+    migrate(fresh)
+
+    assert [row[:2] for row in schema(upgraded)] == [row[:2] for row in schema(fresh)]
+
+
+def test_migrate_is_idempotent(tmp_path):
+    conn = baseline_database(tmp_path / 'bot.db')
+    migrate(conn)
+    before = schema(conn)
+    migrate(conn)
+
+    assert schema(conn) == before
+    assert conn.execute('SELECT COUNT(*) FROM daily_reading').fetchone()[0] == 1
+
+
+def test_rollups_are_keyed_by_club_after_upgrade(tmp_path):
+    conn = baseline_database(tmp_path / 'bot.db')
+    migrate(conn)
+    with conn:
+        conn.execute("INSERT INTO clubs (club_id) VALUES (-5)")
+        conn.execute("INSERT INTO daily_reading VALUES (1, '2026-10-17', 10, -5)")
+
+    assert conn.execute("SELECT club_id, pages_read FROM daily_reading ORDER BY club_id").fetchall() == sorted(
+        [(DEFAULT_CLUB_ID, 39), (-5, 10)])
+
+
+def test_failed_step_is_rolled_back(tmp_path, monkeypatch):
+    conn = sqlite3.connect(tmp_path / 'bot.db', isolation_level=None)
+    steps = migrations.MIGRATIONS + [['CREATE TABLE extra (id INTEGER)', 'INSERT INTO missing VALUES (1)']]
+    monkeypatch.setattr(migrations, 'MIGRATIONS', steps)
+    monkeypatch.setattr(migrations, 'SCHEMA_VERSION', len(steps))
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == len(steps) - 1
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'extra'").fetchone()[0] == 0
+
+
+def test_async_migrations_match_sync_ones(tmp_path):
+    async def run():
+        async with aiosqlite.connect(tmp_path / 'async.db') as conn:
+            await migrate_async(conn)
+    asyncio.run(run())
+    migrated_async = sqlite3.connect(tmp_path / 'async.db')
+    migrated_sync = sqlite3.connect(tmp_path / 'sync.db')
+    migrate(migrated_sync)
+
+    assert migrated_async.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+    assert schema(migrated_async) == schema(migrated_sync)
@@ -0,0 +1,101 @@
+import asyncio
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from sender import MessageQueue, TokenBucket
+
+
+class FakeBot:
+    # Records delivered messages; `errors` maps a text to exceptions raised,
+    # one per attempt, before it goes through.
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        SendMessage(chat_id=chat_id, text=text, **kwargs)
+        errors = self.errors.get(text)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, text))
+
+
+def fast_queue(bot, **kwargs):
+    return MessageQueue(bot, chat_rate=1000, chat_burst=1000, global_rate=1000, **kwargs)
+
+
+def test_messages_are_delivered_in_order_per_chat():
+    async def run():
+        bot = FakeBot()
+        queue = fast_queue(bot)
+        for n in range(3):
+            queue.send(1, f"a{n}", parse_mode=f"p{n}")
+            queue.send(2, f"b{n}", parse_mode=f"p{n}")
+        await queue.close()
+        return bot.sent, queue.stats()
+
+    sent, stats = asyncio.run(run())
+    assert [text for chat_id, text in sent if chat_id == 1] == ['a0', 'a1', 'a2']
+    assert [text for chat_id, text in sent if chat_id == 2] == ['b0', 'b1', 'b2']
+    assert stats['sent'] == 6
+    assert stats['depth'] == 0
+
+
+def test_queued_texts_with_the_same_options_are_merged():
+    async def run():
+        bot = FakeBot()
+        queue = MessageQueue(bot, chat_rate=1000, chat_burst=1, global_rate=1000)
+        queue.send(1, "first")
+        await asyncio.sleep(0.01)
+        queue.send(1, "second")
+        queue.send(1, "third")
+        await queue.close()
+        return bot.sent, queue.coalesced
+
+    sent, coalesced = asyncio.run(run())
+    assert sent == [(1, "first"), (1, "second\n\nthird")]
+    assert coalesced == 1
+
+
+def test_flood_limit_is_retried():
+    async def run():
+        flood = TelegramRetryAfter(SendMessage(chat_id=1, text="hi"), "Too Many Requests", retry_after=0)
+        bot = FakeBot({"hi": [flood, flood]})
+        queue = fast_queue(bot)
+        queue.send(1, "hi")
+        await queue.close()
+        return bot.sent, queue.stats()
+
+    sent, stats = asyncio.run(run())
+    assert sent == [(1, "hi")]
+    assert stats['retried'] == 2
+    assert stats['failed'] == 0
+
+
+def test_failed_message_does_not_stop_the_chat_queue():
+    async def run():
+        bad = TelegramBadRequest(SendMessage(chat_id=1, text="bad"), "message is too long")
+        bot = FakeBot({"bad": [bad]})
+        queue = fast_queue(bot)
+        queue.send(1, "bad", parse_mode="HTML")
+        queue.send(1, None)
+        queue.send(None, None)
+        queue.send(1, "ok")
+        await queue.close()
+        return bot.sent, queue.stats(), queue.workers
+
+    sent, stats, workers = asyncio.run(run())
+    assert sent == [(1, "ok")]
+    assert stats['failed'] == 3
+    assert not workers
+
+
+def test_token_bucket_spaces_out_messages():
+    async def run():
+        bucket = TokenBucket(rate=100, capacity=2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for _ in range(4):
+            await bucket.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(run()) >= 0.015
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from aiogram.fsm.storage.base import StorageKey
+from database import AsyncDatabase
+from storage import SQLiteStorage
+
+
+def key(user_id):
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+async def open_storage(path, **kwargs):
+    db = AsyncDatabase(str(path))
+    await db.connect()
+    return db, SQLiteStorage(db, **kwargs)
+
+
+async def rows(db):
+    return await db.fetchall('SELECT key, state, data FROM fsm_states ORDER BY key')
+
+
+def test_state_survives_restart(tmp_path):
+    async def run():
+        db, storage = await open_storage(tmp_path / 'bot.db')
+        await storage.set_state(key(1), 'UserStates:waiting_for_confirmation')
+        await storage.set_data(key(1), {'report': 'text', 'club_id': -5})
+        await storage.close()
+        await db.close()
+
+        db, storage = await open_storage(tmp_path / 'bot.db')
+        try:
+            return await storage.get_state(key(1)), await storage.get_data(key(1))
+        finally:
+            await db.close()
+
+    state, data = asyncio.run(run())
+    assert state == 'UserStates:waiting_for_confirmation'
+    assert data == {'report': 'text', 'club_id': -5}
+
+
+def test_flush_writes_only_dirty_keys_and_deletes_cleared_ones(tmp_path):
+    async def run():
+        db, storage = await open_storage(tmp_path / 'bot.db')
+        await storage.set_state(key(1), 'a')
+        await storage.set_state(key(2), 'b')
+        await storage.flush()
+        first = await rows(db)
+        await storage.set_state(key(1), None)
+        await storage.flush()
+        second = await rows(db)
+        await db.close()
+        return first, second, storage.dirty
+
+    first, second, dirty = asyncio.run(run())
+    assert [row[1] for row in first] == ['a', 'b']
+    assert [row[1] for row in second] == ['b']
+    assert not dirty
+
+
+def test_abandoned_states_expire(tmp_path):
+    async def run():
+        db, storage = await open_storage(tmp_path / 'bot.db', ttl=60)
+        await storage.set_data(key(1), {'book_name': 'Dune'})
+        await storage.flush()
+        storage.entries[storage._key(key(1))].touched = time.time() - 120
+        storage.expire()
+        await storage.flush()
+        data = await storage.get_data(key(1))
+        left = await rows(db)
+        await db.close()
+        return data, left
+
+    data, left = asyncio.run(run())
+    assert data == {}
+    assert left == []
+
+
+def test_expired_rows_are_not_loaded_after_restart(tmp_path):
+    async def run():
+        db, storage = await open_storage(tmp_path / 'bot.db', ttl=60)
+        await storage.set_state(key(1), 'a')
+        await storage.close()
+        async with db.transaction() as conn:
+            await conn.execute('UPDATE fsm_states SET updated_at = ?', (time.time() - 120,))
+        storage = SQLiteStorage(db, ttl=60)
+        state = await storage.get_state(key(1))
+        await db.close()
+        return state
+
+    assert asyncio.run(run()) is None
+
+
+def test_memory_is_bounded_but_dirty_entries_are_kept(tmp_path):
+    async def run():
+        db, storage = await open_storage(tmp_path / 'bot.db', max_entries=3)
+        for user_id in range(5):
+            await storage.set_state(key(user_id), 'a')
+        dirty_size = len(storage.entries)
+        await storage.flush()
+        flushed_size = len(storage.entries)
+        state = await storage.get_state(key(0))
+        await db.close()
+        return dirty_size, flushed_size, state
+
+    dirty_size, flushed_size, state = asyncio.run(run())
+    assert dirty_size == 5
+    assert flushed_size == 3
+    assert state == 'a'
+
+
+def test_close_during_flush_keeps_pending_keys(tmp_path):
+    async def run():
+        db, storage = await open_storage(tmp_path / 'bot.db', flush_interval=0.01)
+        await storage.set_data(key(1), {'report': 'text'})
+        transaction = db.transaction
+
+        @asynccontextmanager
+        async def slow_transaction():
+            await asyncio.sleep(1)
+            async with transaction() as conn:
+                yield conn
+
+        db.transaction = slow_transaction
+        storage.start()
+        await asyncio.sleep(0.05)
+        db.transaction = transaction
+        await storage.close()
+        await db.close()
+
+        db, storage = await open_storage(tmp_path / 'bot.db')
+        try:
+            return await storage.get_data(key(1))
+        finally:
+            await db.close()
+
+    assert asyncio.run(run()) == {'report': 'text'}